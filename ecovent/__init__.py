@@ -11,6 +11,34 @@ class Fan(object):
     HEADER = bytes.fromhex('6D6F62696C65')
     FOOTER = bytes.fromhex('0D0A')
 
+    params = {
+        0x03: [1, 'state', None],
+        0x04: [1, 'speed', None],
+        0x05: [1, 'manual_speed', None],
+        0x06: [1, 'air_flow_direction', None],
+        0x08: [1, 'humidity_level', None],
+        0x09: [1, 'operation_mode', None],
+        0x0B: [1, 'humidity_sensor_threshold', None],
+        0x0C: [1, 'alarm_status', None],
+        0x0D: [1, 'relay_sensor_status', None],
+        0x0E: [3, 'party_or_night_mode_countdown', None],
+        0x0F: [3, 'night_mode_timer', None],
+        0x10: [3, 'party_mode_timer', None],
+        0x11: [3, 'deactivation_timer', None],
+        0x12: [1, 'filter_eol_timer', None],
+        0x13: [1, 'humidity_sensor_status', None],
+        0x14: [1, 'boost_mode', None],
+        0x15: [1, 'humidity_sensor', None],
+        0x16: [1, 'relay_sensor', None],
+        0x17: [1, '10V_sensor', None],
+        0x19: [1, '10V_sensor_threshold', None],
+        0x1A: [1, '10V_sensor_status', None],
+        0x1B: [32, 'slave_device_search', None],
+        0x1C: [4, 'response_slave_search', None],
+        0x1F: [1, 'cloud_activation', None],
+        0x25: [1, '10V_sensor_current_status', None]
+    }
+
     def __init__(self, host, name="ecofan", port=4000):
         self._name = name
         self._host = host
@@ -20,6 +48,7 @@ class Fan(object):
         self._fan_man_speed = None
         self._fan_airflow = None
         self._fan_humidity = None
+        self._buffer = bytearray(98)
 
     def connect(self):
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -38,11 +67,17 @@ class Fan(object):
         except socket.timeout:
             return None
 
+    def receive_into(self, buffer):
+        try:
+            return self.socket.recv_into(buffer)
+        except socket.timeout:
+            return 0
+
     def update(self):
         self.send(bytes.fromhex('0100'))
-        response = self.receive()
-        if response:
-            self.parse_response(response[6:])
+        size = self.receive_into(self._buffer)
+        if size:
+            self.parse_response(memoryview(self._buffer)[6:size])
             self.socket.close()
             return 0
         else:
@@ -102,35 +137,8 @@ class Fan(object):
             yield(param,value)
 
     def parse_response(self, data):
-        fan_params = {
-        0x03: [1, 'state', None],
-        0x04: [1, 'speed', None],
-        0x05: [1, 'manual_speed', None],
-        0x06: [1, 'air_flow_direction', None],
-        0x08: [1, 'humidity_level', None],
-        0x09: [1, 'operation_mode', None],
-        0x0B: [1, 'humidity_sensor_threshold', None],
-        0x0C: [1, 'alarm_status', None],
-        0x0D: [1, 'relay_sensor_status', None],
-        0x0E: [3, 'party_or_night_mode_countdown', None],
-        0x0F: [3, 'night_mode_timer', None],
-        0x10: [3, 'party_mode_timer', None],
-        0x11: [3, 'deactivation_timer', None],
-        0x12: [1, 'filter_eol_timer', None],
-        0x13: [1, 'humidity_sensor_status', None],
-        0x14: [1, 'boost_mode', None],
-        0x15: [1, 'humidity_sensor', None],
-        0x16: [1, 'relay_sensor', None],
-        0x17: [1, '10V_sensor', None],
-        0x19: [1, '10V_sensor_threshold', None],
-        0x1A: [1, '10V_sensor_status', None],
-        0x1B: [32, 'slave_device_search', None],
-        0x1C: [4, 'response_slave_search', None],
-        0x1F: [1, 'cloud_activation', None],
-        0x25: [1, '10V_sensor_current_status', None]
-        }
-
-        for pair in self.parsebytes(data, fan_params):
+        before = self.get_values()
+        for pair in self.parsebytes(data, self.params):
             if pair[0] == 3:
                 self.state = pair[1][0]
             elif pair[0] == 4:
@@ -141,6 +149,27 @@ class Fan(object):
                 self.airflow = pair[1][0]
             elif pair[0] == 8:
                 self.humidity = pair[1][0]
+        after = self.get_values()
+        return [ name for name in after if after[name] != before[name] ]
+
+    def poll_frames(self):
+        """ Frames for update() when polled by an ecoventv2 Fleet """
+        return [ Fan.HEADER + bytes.fromhex('0100') + Fan.FOOTER ]
+
+    def apply_frame(self, frame):
+        """ Apply a whole response frame, returns the names of changed values """
+        return self.parse_response(memoryview(frame)[6:])
+
+    def end_poll(self, complete):
+        pass
+
+    def get_values(self):
+        return { 'state': self.state, 'speed': self.speed, 'man_speed': self.man_speed,
+                 'airflow': self.airflow, 'humidity': self.humidity }
+
+    def changed_values(self, changed):
+        values = self.get_values()
+        return { name: values[name] for name in changed }
 
     @property
     def name(self):
@@ -7,9 +7,37 @@ import sys
 import time
 import math
 
+from . import metrics, protocol, schema, trace
+from .scheduler import BACKGROUND, INTERACTIVE
+from .store import DictStore, FleetStore
+
+class ParamView(object):
+    """Attribute of a Fan showing one schema parameter as a display string"""
+
+    def __init__(self, param, default=None):
+        self.idx = param.id
+        self.decode = schema.decoders[param.id]
+        self.fmt = schema.formatters[param.id]
+        self.default = default
+
+    def __get__(self, fan, owner):
+        if fan is None:
+            return self
+        raw = fan._store.get(fan._row, self.idx)
+        if raw is None:
+            return self.default
+        return self.fmt(self.decode(raw))
+
+    def __set__(self, fan, input):
+        fan._store.put(fan._row, self.idx, bytes.fromhex(input))
+
 class Fan(object):
     """Class to communicate with the ecofan"""
     
+    __slots__ = ('_name', '_host', '_port', '_type', '_id', '_pwd_size', '_password',
+                 '_store', '_row', '_registry', '_registry_id', '_probe', 'cache_max_age', 'max_response', 'last_errors', 'last_unsupported',
+                 'scheduler', 'socket')
+
     HEADER = f'FDFD'
 
     func = {
@@ -20,132 +48,29 @@ class Fan(object):
         'dec': "05",
         'resp': "06"
     }
-    states = {
-        0: 'off',
-        1: 'on' ,
-        2: 'togle'
-    }
-
-    speeds = {
-         0: 'standby',
-         1: 'low', 
-         2: 'medium', 
-         3: 'high', 
-         0xff: 'manual'
-    }
-
-    timer_modes = {
-        0: 'off', 
-        1: 'night', 
-        2: 'party' 
-    }
-
-    statuses = {
-        0: 'off', 
-        1: 'on' 
-    }
-
-    airflows = {
-        0: 'ventilation',
-        1: 'heat_recovery', 
-        2: 'air_supply' 
-    } 
-
-    alarms = {
-        0: 'no', 
-        1: 'alarm', 
-        2: 'warning' 
-    }
-    
-    days_of_week = {
-        0: 'all days',
-        1: 'Monday',
-        2: 'Tuesday',
-        3: 'Wednesday',
-        4: 'Thursday',
-        5: 'Friday',
-        6: 'Saturday',
-        7: 'Sunday',
-        8: 'Mon-Fri',
-        9: 'Sat-Sun',
-    }  
-
-    filters = {
-        0: 'filter replacement not required' , 
-        1: 'replace filter' 
-    }
-    
-    unit_types = {
-                    0x0300: 'Vento Expert A50-1/A85-1/A100-1 W V.2', 
-                    0x0400: 'Vento Expert Duo A30-1 W V.2', 
-                    0x0500: 'Vento Expert A30 W V.2' }
-
-    wifi_operation_modes = {
-        1: 'client' ,
-        2: 'ap' 
-    }
-
-    wifi_enc_types =  {  
-            48: 'Open', 
-            50: 'wpa-psk' , 
-            51: 'wpa2_psk',  
-            52: 'wpa_wpa2_psk' 
-    } 
-
-    wifi_dhcps = {
-        0: 'STATIC', 
-        1: 'DHCP', 
-        2: 'Invert' 
-    }
-    
-    params = {
-        0x0001: [ 'state', states ],
-        0x0002: [ 'speed', speeds ],
-        0x0006: [ 'boost_status', statuses ],
-        0x0007: [ 'timer_mode', timer_modes ],
-        0x000b: [ 'timer_counter', None ],
-        0x000f: [ 'humidity_sensor_state', states ],
-        0x0014: [ 'relay_sensor_state', states ],
-        0x0016: [ 'analogV_sensor_state', states ],
-        0x0019: [ 'humidity_treshold', None ],
-        0x0024: [ 'battery_voltage', None ],
-        0x0025: [ 'humidity', None ],
-        0x002d: [ 'analogV', None ],
-        0x0032: [ 'relay_status', statuses ],
-        0x0044: [ 'man_speed', None ],
-        0x004a: [ 'fan1_speed', None ],
-        0x004b: [ 'fan2_speed', None ],
-        0x0064: [ 'filter_timer_countdown', None ],
-        0x0066: [ 'boost_time', None ],
-        0x006f: [ 'rtc_time', None ],
-        0x0070: [ 'rtc_date', None ],
-        0x0072: [ 'weekly_schedule_state', states ],
-        0x0077: [ 'weekly_schedule_setup', None ],        
-        0x007c: [ 'device_search', None ],
-        0x007d: [ 'device_password', None ],
-        0x007e: [ 'machine_hours', None ],
-        0x0083: [ 'alarm_status', alarms ],
-        0x0085: [ 'cloud_server_state', states ],
-        0x0086: [ 'firmware', None ],
-        0x0088: [ 'filter_replacement_status', statuses ],
-        0x0094: [ 'wifi_operation_mode', wifi_operation_modes  ],
-        0x0095: [ 'wifi_name' , None ],
-        0x0096: [ 'wifi_pasword', None ],
-        0x0099: [ 'wifi_enc_type', wifi_enc_types ],
-        0x009a: [ 'wifi_freq_chnnel', None ],
-        0x009b: [ 'wifi_dhcp', wifi_dhcps  ],
-        0x009c: [ 'wifi_assigned_ip', None ],
-        0x009d: [ 'wifi_assigned_netmask', None ],
-        0x009e: [ 'wifi_main_gateway', None ],
-        0x00a3: [ 'curent_wifi_ip', None ],
-        0x00b7: [ 'airflow' , airflows ],
-        0x00b8: [ 'analogV_treshold', None ],
-        0x00b9: [ 'unit_type', unit_types ],
-        0x0302: [ 'night_mode_timer', None ],
-        0x0303: [ 'party_mode_timer', None ],
-        0x0304: [ 'humidity_status', statuses ],
-        0x0305: [ 'analogV_status', statuses ],
-    }
+    states = schema.states
+    speeds = schema.speeds
+    timer_modes = schema.timer_modes
+    statuses = schema.statuses
+    airflows = schema.airflows
+    alarms = schema.alarms
+    days_of_week = schema.days_of_week
+    filters = schema.filters
+    unit_types = schema.unit_types
+    wifi_operation_modes = schema.wifi_operation_modes
+    wifi_enc_types = schema.wifi_enc_types
+    wifi_dhcps = schema.wifi_dhcps
+
+    params = { p.id: [ p.name, p.enum ] for p in schema.SCHEMA }
+
+    # params answered by each unit type and firmware, shared by all fans
+    models = {}
+
+    # receive buffers shared by all fans
+    buffers = protocol.BufferPool()
+
+    # parse results shared by all fans, so a response allocates no Response
+    responses = protocol.ResponsePool()
 
     write_only_params = {
         0x0065: [ 'filter_timer_reset', None ],
@@ -156,7 +81,7 @@ class Fan(object):
         0x00a2: [ 'wifi_discard_and_quit', None ],
     }
 
-    def __init__(self, host, password="1111", fan_id="DEFAULT_DEVICEID", name="ecofanv2", port=4000 ):
+    def __init__(self, host, password="1111", fan_id="DEFAULT_DEVICEID", name="ecofanv2", port=4000, store=None, row=None, autoupdate=True, registry=None, scheduler=None ):
         self._name = name
         self._host = host
         self._port = port
@@ -164,18 +89,37 @@ class Fan(object):
         self._id = fan_id
         self._pwd_size = 0
         self._password = password
-        self._state = 'unknown'
-
-        if fan_id == "DEFAULT_DEVICEID":
-            self.get_param( 'device_search' )
-            self._id = self.device_search        
-        self.update()
+        if store == None:
+            store = DictStore()
+        self._store = store
+        if row == None:
+            row = store.add_row()
+        self._row = row
+        self._registry = registry
+        # device id taken from the registry and not answered to yet
+        self._registry_id = False
+        self._probe = None
+        self.cache_max_age = 60
+        self.max_response = 1024
+        self.last_errors = []
+        self.last_unsupported = []
+        self.scheduler = scheduler
+
+        if registry != None:
+            self.models.update(registry.models)
+            self._registry_id = registry.restore(self)
+        if autoupdate:
+            if self._id == "DEFAULT_DEVICEID":
+                self.get_param( 'device_search' )
+                self._id = self.device_search
+            self.update()
 
     def connect(self):
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.settimeout(4)
-        self.socket.connect((self._host, self._port))
-        return self.socket
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.settimeout(4)
+        sock.connect((self._host, self._port))
+        self.socket = sock
+        return sock
 
     def str2hex(self,str_msg):
         return "".join("{:02x}".format(ord(c)) for c in str_msg)
@@ -204,9 +148,9 @@ class Fan(object):
         return str
 
     def get_params_index(self, value):
-        for i in ( self.params ):
-            if self.params[i][0] == value:
-                return i
+        param = schema.by_name.get(value)
+        if param != None:
+            return param.id
                 
     def get_params_values(self, idx, value ):
         index = self.get_params_index(idx)
@@ -219,11 +163,59 @@ class Fan(object):
         else:
             return [ None, None ]
 
-    def send(self, data):
-        self.socket = self.connect()
+    def resolve_id(self):
+        """ Adopt the device id reported by device_search while the default id is in use """
+        if self._id == "DEFAULT_DEVICEID" and self.device_search != None:
+            self._id = self.device_search
+
+    def build_frame(self, data):
+        self.resolve_id()
         payload = self.get_header() + data
         payload = self.HEADER + payload + self.chksum(payload)
-        return self.socket.sendall( bytes.fromhex(payload))
+        return bytes.fromhex(payload)
+
+    def read_frames(self, param):
+        """ Read request frames for the concatenated 4 digit ids in param, split
+            so that no response is longer than max_response bytes """
+        ids = [ int(param[i:(i+4)], 16) for i in range(0, len(param), 4) ]
+        space = self.max_response - protocol.frame_overhead(self._id, self._password)
+        frames = []
+        for chunk in protocol.split_request(ids, space):
+            request = "".join(hex(idx).replace("0x","").zfill(4) for idx in chunk)
+            frames.append(self.build_frame(self.func['read'] + self.encode_params(request)))
+        return frames
+
+    def poll_frames(self):
+        """ Frames for update(), or for device_search while the device id is unknown.
+            Call end_poll() once the responses are applied """
+        self.resolve_id()
+        if self._id == "DEFAULT_DEVICEID":
+            return [ self.build_frame(self.func['read'] + self.encode_params("007c")) ]
+        if self.supported_params() == None:
+            self._probe = []
+        return self.read_frames(self.update_request())
+
+    def apply_frame(self, frame):
+        """ Apply a response to poll_frames(), returns the ids of changed params
+            or None when frame is not an answer of this fan """
+        if self._id == "DEFAULT_DEVICEID":
+            return self.parse_response(frame)
+        return self.parse_response(frame, self._id)
+
+    def end_poll(self, complete):
+        """ Finish a poll, a complete probe is remembered for the model. A device
+            id from the registry that got no answer is dropped for device_search """
+        if complete and self._probe:
+            self.learn_model(self._probe)
+        self._probe = None
+        if self._registry_id:
+            self._registry_id = False
+            self._registry.forget(self._host, self._port)
+            self._id = "DEFAULT_DEVICEID"
+
+    def send(self, data):
+        self.socket = self.connect()
+        return self.socket.sendall(self.build_frame(data))
 
     def receive(self):
         try:
@@ -232,48 +224,227 @@ class Fan(object):
         except socket.timeout:
             return None
 
-    def do_func (self, func, param, value="" ):
+    def receive_into(self, buffer, sock=None):
+        """ Receive one datagram into buffer from sock (default the last connected
+            socket), returns its size or 0 on timeout or when nothing listens
+            on the port """
+        if sock == None:
+            sock = self.socket
+        try:
+            return sock.recv_into(buffer)
+        except (socket.timeout, ConnectionRefusedError):
+            return 0
+
+    def encode_param(self, param, value="", page="00"):
+        """ Encode one parameter id (4 hex digits) with an optional hex value,
+            page is the high byte of the previous id in the same request """
+        n_out = ""
+        if value != "":
+            val_bytes = int(len(value) / 2 ) ;
+        else:
+            val_bytes = 0
+        if param[:2] != "00" or page != "00":
+            n_out = "ff" + param[:2]
+        if val_bytes > 1:
+            n_out += "fe" + hex(val_bytes).replace("0x","").zfill(2) + param[2:4]
+        else:
+            n_out += param[2:4]
+        return n_out + value
+
+    def encode_params(self, param, value=""):
+        """ Encode the concatenated 4 digit ids in param, each with value """
         out = ""
         parameter = ""
+        page = "00"
         for i in range (0,len(param), 4):
-            n_out = ""
             out = param[i:(i+4)] ;
             if out == "0077" and value =="" :
                 value="0101"
-            if value != "":
-                val_bytes = int(len(value) / 2 ) ;
-            else:
-                val_bytes = 0
-            if out[:2] != "00":
-                n_out = "ff" + out[:2]
-            if val_bytes > 1:
-                n_out += "fe" + hex(val_bytes).replace("0x","").zfill(2) + out[2:4]
-            else:
-                n_out += out[2:4]
-            parameter += n_out  + value
+            parameter += self.encode_param(out, value, page)
+            page = out[:2]
             if out == "0077":
                 value = ""
-        data = func + parameter 
-        self.send(data)
-        response = self.receive()
-        if response:
-            self.parse_response(response)
-            self.socket.close()
+        return parameter
 
-    def update(self):
+    def do_func (self, func, param, value="" ):
+        self.request(func + self.encode_params(param, value))
+
+    def request(self, data):
+        """ Send one request frame and apply the response, returns whether it was answered """
+        tracer = trace.tracer
+        if tracer != None:
+            start = tracer.now()
+        frame = self.build_frame(data)
+        if tracer != None:
+            tracer.add('encode', start, self._host)
+        received = self.request_frames([ frame ])
+        if tracer != None:
+            tracer.add('request', start, self._host)
+        return received == 1
+
+    def request_frames(self, frames, priority=INTERACTIVE):
+        """ Send frames back to back and apply the responses as they arrive,
+            returns the number of responses received. With a scheduler the
+            frames wait until the device may take them at priority """
+        if self.scheduler == None:
+            return self.exchange_frames(frames)
+        tracer = trace.tracer
+        if tracer != None:
+            start = tracer.now()
+        self.scheduler.acquire(self._host, len(frames), priority)
+        if tracer != None:
+            tracer.add('queue', start, self._host)
+        try:
+            return self.exchange_frames(frames)
+        finally:
+            self.scheduler.release(self._host)
+
+    def exchange_frames(self, frames):
+        tracer = trace.tracer
+        if tracer != None:
+            start = tracer.now()
+        # a socket of its own, requests from other threads connect and close theirs
+        sock = self.connect()
+        for frame in frames:
+            sock.sendall(frame)
+        stats = metrics.stats
+        stats.frames_sent += len(frames)
+        stats.bytes_sent += sum(len(frame) for frame in frames)
+        if tracer != None:
+            tracer.add('send', start, self._host)
+        received = 0
+        buffer = self.buffers.acquire()
+        try:
+            while received < len(frames):
+                if tracer != None:
+                    start = tracer.now()
+                size = self.receive_into(buffer, sock)
+                if tracer != None:
+                    tracer.add('wait', start, self._host)
+                if not size:
+                    break
+                stats.responses += 1
+                stats.bytes_received += size
+                self.parse_response(buffer[:size])
+                received += 1
+        finally:
+            self.buffers.release(buffer)
+            sock.close()
+            stats.timeouts += len(frames) - received
+        return received
+
+    def all_params_request(self):
         request = "";
         for param in self.params:
             request += hex(param).replace("0x","").zfill(4)
-        self.do_func(self.func['read'], request)
+        return request
+
+    def update_request(self):
+        """ Ids to read on update, only the params this model answers once it is probed """
+        supported = self.supported_params()
+        if supported == None:
+            return self.all_params_request()
+        request = "";
+        for param in self.params:
+            if param in supported:
+                request += hex(param).replace("0x","").zfill(4)
+        return request
 
-    def set_param ( self, param, value ):
+    def update(self):
+        tracer = trace.tracer
+        if tracer != None:
+            start = tracer.now()
+        frames = self.poll_frames()
+        if tracer != None:
+            tracer.add('encode', start, self._host)
+        self.end_poll(self.request_frames(frames, BACKGROUND) == len(frames))
+        if tracer != None:
+            tracer.add('update', start, self._host)
+
+    def is_current(self, idx, value):
+        """ True when the last confirmed value of parameter idx equals value
+            and is not older than cache_max_age seconds """
+        stamp = self._store.stamp(self._row, idx)
+        if stamp is None or time.monotonic() - stamp > self.cache_max_age:
+            return False
+        return self._store.get(self._row, idx) == bytes.fromhex(value)
+
+    def get_write_value(self, param, value):
         valpar = self.get_params_values (param, value)
         if valpar[0] !=  None:
             if valpar[1] != None:
-                self.do_func( self.func['write_return'], hex(valpar[0]).replace("0x","").zfill(4), hex(valpar[1]).replace("0x","").zfill(2) )
-            else:
-                self.do_func( self.func['write_return'], hex(valpar[0]).replace("0x","").zfill(4), value )
-                
+                value = hex(valpar[1]).replace("0x","").zfill(2)
+            elif not isinstance(value, str):
+                value = schema.encode(valpar[0], value).hex()
+            return [ valpar[0], value ]
+        return [ None, None ]
+
+    def set_param ( self, param, value, force=False ):
+        """ Write value to param, skipped when the fan already reports that value.
+            Use force=True to always send the write.
+            value is an enum name, a hex string or a typed value (see schema) """
+        idx, value = self.get_write_value(param, value)
+        if idx != None:
+            if force or not self.is_current(idx, value):
+                self.do_func( self.func['write_return'], hex(idx).replace("0x","").zfill(4), value )
+
+    def set_params ( self, params, force=False ):
+        """ Write several params in one request, { 'speed': 'low', 'airflow': 'ventilation' }.
+            Params already at the requested value are left out unless force=True.
+            Returns False when the fan did not answer """
+        parameter = ""
+        page = "00"
+        for param in params:
+            idx, value = self.get_write_value(param, params[param])
+            if idx != None:
+                if force or not self.is_current(idx, value):
+                    out = hex(idx).replace("0x","").zfill(4)
+                    parameter += self.encode_param(out, value, page)
+                    page = out[:2]
+        if parameter != "":
+            return self.request(self.func['write_return'] + parameter)
+        return True
+
+    def adjust_params ( self, func, steps ):
+        """ Change several numeric params relative to their current value in one
+            'inc' or 'dec' request, { 'man_speed': 10, 'boost_time': 5 }. The device
+            applies the steps itself, returns the typed values it reports by name.
+            Raises ValueError for a param that can not be stepped or a step that
+            does not fit it and TimeoutError if the device does not answer """
+        parameter = ""
+        page = "00"
+        names = []
+        for param in steps:
+            idx = self.get_params_index(param)
+            if idx != None:
+                if not schema.by_id[idx].writable or schema.by_id[idx].kind not in ('uint', 'percent'):
+                    raise ValueError(param + " can not be incremented")
+                try:
+                    step = schema.encode(idx, steps[param]).hex()
+                except (OverflowError, ValueError):
+                    raise ValueError("step of " + param + " out of range: " + str(steps[param]))
+                out = hex(idx).replace("0x","").zfill(4)
+                parameter += self.encode_param(out, step, page)
+                page = out[:2]
+                names.append(schema.by_id[idx].name)
+        if parameter != "" and not self.request(self.func[func] + parameter):
+            raise TimeoutError("no response from " + self.host)
+        return { name: self.get_value(name) for name in names }
+
+    def increment_params ( self, steps ):
+        return self.adjust_params('inc', steps)
+
+    def decrement_params ( self, steps ):
+        return self.adjust_params('dec', steps)
+
+    def increment ( self, param, step=1 ):
+        """ Raise param by step in one round-trip, returns its new typed value """
+        return self.increment_params({ param: step }).get(param)
+
+    def decrement ( self, param, step=1 ):
+        """ Lower param by step in one round-trip, returns its new typed value """
+        return self.decrement_params({ param: step }).get(param)
+
     def get_param ( self, param ):
         idx = self.get_params_index (param)
         if idx !=  None:
@@ -313,56 +484,78 @@ class Fan(object):
             value = hex(val).replace("0x","").zfill(2)
             self.do_func ( self.func['write_return'], request, value )
 
-    def parse_response(self,data):
-        pointer = 20 ; # discard header bytes 
-        length = len(data) - 2 ;
-        pwd_size = data[pointer] 
-        pointer += 1
-        password = data[pointer:pwd_size]
-        pointer += pwd_size
-        function = data[pointer]
-        pointer += 1
-        # from here parsing of parameters begin
-        payload=data[pointer:length]
-        response = bytearray()
-        ext_function = 0
-        value_counter = 1
-        high_byte_value = 0
-        parameter = 1 ;
-        for p in payload:
-            if parameter and p == 0xff:
-                ext_function = 0xff
-                # print ( "def ext:" + hex(0xff) )
-            elif parameter and p == 0xfe:
-                ext_function = 0xfe
-                # print ( "def ext:" + hex(0xfe) )
-            elif parameter and p == 0xfd:
-                ext_function = 0xfd
-                # print ( "dev ext:" + hex(0xfd) )
-            else:
-                if ext_function == 0xff:
-                    high_byte_value = p
-                    ext_function = 1
-                elif ext_function == 0xfe:
-                    value_counter = p
-                    ext_function = 2
-                elif ext_function == 0xfd:
-                    None
-                else:
-                    if ( parameter == 1 ):
-                        # print ("appending: " + hex(high_byte_value))
-                        response.append(high_byte_value)
-                        parameter = 0
-                    else:
-                        value_counter -= 1
-                    response.append(p)
-
-            if value_counter <= 0:
-                parameter = 1
-                value_counter = 1
-                high_byte_value = 0
-                setattr ( self, self.params[int(response[:2].hex(),16)][0], response[2:].hex())
-                response = bytearray()
+    def parse_response(self, data, device_id=None):
+        """ Store the values of a response, returns the ids of changed params.
+            Fields that could not be used are skipped and listed in last_errors,
+            the ids the fan marked as unsupported are listed in last_unsupported.
+            With device_id, the response of any other device is ignored and
+            None returned """
+        response = self.responses.acquire()
+        try:
+            tracer = trace.tracer
+            if tracer != None:
+                start = tracer.now()
+            payload = protocol.parse_header(data, response)
+            if device_id != None and response.device_id != device_id:
+                return None
+            self._registry_id = False
+            changed = []
+            # a stale value confirmed unchanged is not a change, but the row is newer
+            confirmed = False
+            now = time.monotonic()
+            store, row, probe = self._store, self._row, self._probe
+            # values are stored as they are parsed, without collecting them first
+            if payload != None:
+                for idx, raw in protocol.iter_fields(payload, response):
+                    stale = store.stamp(row, idx) == None
+                    if store.put(row, idx, raw, now):
+                        changed.append(idx)
+                    elif stale:
+                        confirmed = True
+                    if probe != None:
+                        probe.append(idx)
+            if tracer != None:
+                start = tracer.add('decode', start, self._host)
+            # the response is reused, lists are only copied when there is something in them
+            if response.errors or self.last_errors:
+                self.last_errors = list(response.errors)
+            if response.unsupported or self.last_unsupported:
+                self.last_unsupported = list(response.unsupported)
+            if response.errors:
+                metrics.stats.decode_errors += len(response.errors)
+            if changed or confirmed:
+                store.touch(row)
+            if changed and self._registry != None and any(schema.by_id[idx].tier == 2 for idx in changed):
+                self._registry.remember(self)
+            if tracer != None:
+                tracer.add('apply', start, self._host)
+            return changed
+        finally:
+            self.responses.release(response)
+
+    def model(self):
+        """ Key of the unit type and firmware of the fan, None while unknown """
+        unit_type = self._store.get(self._row, 0x00b9)
+        firmware = self._store.get(self._row, 0x0086)
+        if unit_type != None and firmware != None:
+            return unit_type.hex() + '-' + firmware.hex()
+
+    def supported_params(self):
+        """ Ids of the params this model answers, None until probed """
+        return self.models.get(self.model())
+
+    def learn_model(self, answered):
+        model = self.model()
+        if model != None:
+            self.models[model] = frozenset(answered)
+            if self._registry != None:
+                self._registry.remember_model(model, answered)
+
+    def probe(self):
+        """ Read every known param once and remember which ones this model answers """
+        self._probe = []
+        frames = self.read_frames(self.all_params_request())
+        self.end_poll(self.request_frames(frames) == len(frames))
 
     @property
     def name(self):
@@ -381,6 +574,7 @@ class Fan(object):
             sys.exit()
     @property
     def id(self):
+        self.resolve_id()
         return self._id
 
     @id.setter
@@ -399,413 +593,26 @@ class Fan(object):
     def port(self):
         return self._port
 
-    @property
-    def state(self):
-        return self._state
-
-    @state.setter
-    def state(self, val):
-        self._state = self.states[int(val)]
-
-    @property
-    def speed(self):
-        return self._speed
-
-    @speed.setter
-    def speed(self, input):
-        val = int (input, 16 )
-        self._speed = self.speeds[val]
-        
-    @property
-    def boost_status(self):
-        return self._boost_status
-
-    @boost_status.setter
-    def boost_status(self, input):
-        val = int (input, 16 )
-        self._boost_status = self.statuses[val]
-
-    @property
-    def timer_mode(self):
-        return self._timer_mode
-
-    @timer_mode.setter
-    def timer_mode(self, input):
-        val = int (input, 16 )
-        self._timer_mode = self.timer_modes[val]
-        
-    @property
-    def timer_counter(self):
-        return self._timer_counter
-
-    @timer_counter.setter
-    def timer_counter(self, input):
-        val = int(input,16).to_bytes(3,'big')
-        self._timer_counter = str ( val[2] ) + "h " +str ( val[1] ) + "m " + str ( val[0] ) + "s " 
-
-    @property
-    def humidity_sensor_state(self):
-        return self._humidity_sensor_state
-
-    @humidity_sensor_state.setter
-    def humidity_sensor_state(self, input):
-        val = int (input, 16 )
-        self._humidity_sensor_state = self.states[val]
-
-    @property
-    def relay_sensor_state(self):
-        return self._relay_sensor_state
-
-    @relay_sensor_state.setter
-    def relay_sensor_state(self, input):
-        val = int (input, 16 )
-        self._relay_sensor_state = self.states[val]
-
-    @property
-    def analogV_sensor_state(self):
-        return self._analogV_sensor_state
-
-    @analogV_sensor_state.setter
-    def analogV_sensor_state(self, input):
-        val = int (input, 16 )
-        self._analogV_sensor_state = self.states[val]
-
-    @property
-    def humidity_treshold (self):
-        return self._humidity_treshold
-
-    @humidity_treshold.setter
-    def humidity_treshold(self, input):
-        val = int (input, 16 )
-        self._humidity_treshold = str( val ) + " %"
-        
-    @property
-    def battery_voltage (self):
-        return self._battery_voltage
-
-    @battery_voltage.setter
-    def battery_voltage(self, input):
-        val = int.from_bytes(int(input,16).to_bytes(2,'big'), byteorder='little', signed=False)
-        self._battery_voltage = str( val ) + " mV"        
-
-    @property
-    def humidity (self):
-        return self._humidity
-
-    @humidity.setter
-    def humidity(self, input):
-        val = int (input, 16 )
-        self._humidity = str( val ) + " %"
-
-    @property
-    def analogV (self):
-        return self._analogV
-
-    @analogV.setter
-    def analogV(self, input):
-        val = int (input, 16 )
-        self._analogV = str( val )
-
-    @property
-    def relay_status (self):
-        return self._relay_status
-
-    @relay_status.setter
-    def relay_status(self, input):
-        val = int (input, 16 )
-        self._relay_status = self.statuses[val]
-
-    @property
-    def man_speed(self):
-        return self._man_speed
-
-    @man_speed.setter
-    def man_speed(self, input ):
-        val =  int(input,16)
-        if val >= 0 and val <= 255:
-            self._man_speed = str(int( val / 255 * 100)) + " %"
-        
-    @property
-    def fan1_speed(self):
-        return self._fan1_speed
-
-    @fan1_speed.setter
-    def fan1_speed(self, input ):
-        val = int.from_bytes(int(input,16).to_bytes(2,'big'), byteorder='little', signed=False)
-        self._fan1_speed = str ( val ) + " rpm" 
-        
-    @property
-    def fan2_speed(self):
-        return self._fan2_speed
-
-    @fan2_speed.setter
-    def fan2_speed(self, input ):
-        val = int.from_bytes(int(input,16).to_bytes(2,'big'), byteorder='little', signed=False)
-        self._fan2_speed = str ( val ) + " rpm" 
-
-    @property
-    def filter_timer_countdown(self):
-        return self._filter_timer_countdown
-
-    @filter_timer_countdown.setter
-    def filter_timer_countdown(self, input ):
-        val = int(input,16).to_bytes(3,'big')
-        self._filter_timer_countdown = str ( val[2] ) + "d " +str ( val[1] ) + "h " + str ( val[0] ) + "m " 
-
-    @property
-    def boost_time (self):
-        return self._boost_time
-
-    @boost_time.setter
-    def boost_time(self, input):
-        val = int (input, 16 )
-        self._boost_time = str( val ) + " m"
-
-    @property
-    def rtc_time(self):
-        return self._rtc_time
-
-    @rtc_time.setter
-    def rtc_time(self, input ):
-        val = int(input,16).to_bytes(3,'big')
-        
-        self._rtc_time = str ( val[2] ) + "h " +str ( val[1] ) + "m " + str ( val[0] ) + "s " 
-
-    @property
-    def rtc_date(self):
-        return self._rtc_date
-
-    @rtc_date.setter
-    def rtc_date(self, input ):
-        val = int(input,16).to_bytes(4,'big')
-        self._rtc_date = str ( val[1] ) + " 20" + str ( val[3] ) + "-" +str ( val[2] ).zfill(2 ) + "-" + str( val[0] ).zfill(2 )
-
-    @property
-    def weekly_schedule_state(self):
-        return self._weekly_schedule_state
-
-    @weekly_schedule_state.setter
-    def weekly_schedule_state(self, val):
-        self._weekly_schedule_state = self.states[int(val)]
-
-    @property
-    def weekly_schedule_setup(self):
-        return self._weekly_schedule_setup
-
-    @weekly_schedule_setup.setter
-    def weekly_schedule_setup(self, input):
-        val = int(input,16).to_bytes(6,'big')
-        self._weekly_schedule_setup = self.days_of_week[val[0]] + '/' + str(val[1]) + ': to ' + str(val[5]) + 'h ' + str(val[4]) + 'm ' + self.speeds[val[2]]
-
-    @property
-    def device_search(self):
-        return self._device_search
-
-    @device_search.setter
-    def device_search(self, val):
-        self._device_search = self.hex2str(val)
-        
-    @property
-    def device_password(self):
-        return self._device_password
-
-    @device_password.setter
-    def device_password(self, val):
-        self._device_password = self.hex2str(val)        
-
-    @property
-    def machine_hours(self):
-        return self._machine_hours
-
-    @machine_hours.setter
-    def machine_hours(self, input ):
-        val = int(input,16).to_bytes(4,'big')
-        self._machine_hours = str ( int.from_bytes(val[2:3],'big') ) + "d " + str ( val[1] ) + "h " +str ( val[0] ) + "m "
-
-    @property
-    def alarm_status (self):
-        return self._alarm_status
-
-    @alarm_status.setter
-    def alarm_status(self, input):
-        val = int (input, 16 )
-        self._alarm_status = self.alarms[val]
-
-    @property
-    def cloud_server_state (self):
-        return self._cloud_server_state
-
-    @cloud_server_state.setter
-    def cloud_server_state(self, input):
-        val = int (input, 16 )
-        self._cloud_server_state = self.states[val]
-
-    @property
-    def firmware (self):
-        return self._firmware
-
-    @firmware.setter
-    def firmware(self, input):
-        val = int(input,16).to_bytes(6,'big')
-        self._firmware = str(val[0]) + '.' + str(val[1]) + " " + str(int.from_bytes(val[4:6], byteorder='little', signed=False)) + "-" + str ( val[3] ).zfill(2) + "-" +str ( val[2] ).zfill(2)
-
-    @property
-    def filter_replacement_status (self):
-        return self._filter_replacement_status
-
-    @filter_replacement_status.setter
-    def filter_replacement_status(self, input):
-        val = int (input, 16 )
-        self._filter_replacement_status = self.statuses[val]
-
-    @property
-    def wifi_operation_mode (self):
-        return self._wifi_operation_mode
-
-    @wifi_operation_mode.setter
-    def wifi_operation_mode(self, input):
-        val = int (input, 16 ) 
-        self._wifi_operation_mode = self.wifi_operation_modes[val]
-
-    @property
-    def wifi_name (self):
-        return self._wifi_name
-
-    @wifi_name.setter
-    def wifi_name(self, input):
-        self._wifi_name = self.hex2str(input)
-
-    @property
-    def wifi_pasword (self):
-        return self._wifi_pasword
-
-    @wifi_pasword.setter
-    def wifi_pasword(self, input):
-        self._wifi_pasword = self.hex2str(input)
-        
-    @property
-    def wifi_enc_type (self):
-        return self._wifi_enc_type
-
-    @wifi_enc_type.setter
-    def wifi_enc_type(self, input):
-        val = int (input, 16 )
-        self._wifi_enc_type = self.wifi_enc_types[val]        
-        
-    @property
-    def wifi_freq_chnnel (self):
-        return self._wifi_freq_chnnel
-
-    @wifi_freq_chnnel.setter
-    def wifi_freq_chnnel(self, input):
-        val = int (input, 16 )
-        self._wifi_freq_chnnel = str(val)                
-
-    @property
-    def wifi_dhcp (self):
-        return self._wifi_dhcp
-
-    @wifi_dhcp.setter
-    def wifi_dhcp(self, input):
-        val = int (input, 16 )
-        self._wifi_dhcp = self.wifi_dhcps[val]
-
-    @property
-    def wifi_assigned_ip (self):
-        return self._wifi_assigned_ip
-
-    @wifi_assigned_ip.setter
-    def wifi_assigned_ip(self, input):
-        val = int(input,16).to_bytes(4,'big')
-        self._wifi_assigned_ip = str(val[0]) + '.' + str(val[1]) + "." + str(val[2]) + "." + str ( val[3] )
-
-    @property
-    def wifi_assigned_netmask (self):
-        return self._wifi_assigned_netmask
-
-    @wifi_assigned_netmask.setter
-    def wifi_assigned_netmask(self, input):
-        val = int(input,16).to_bytes(4,'big')
-        self._wifi_assigned_netmask = str(val[0]) + '.' + str(val[1]) + "." + str(val[2]) + "." + str ( val[3] )
-
-    @property
-    def wifi_main_gateway (self):
-        return self._wifi_main_gateway
-
-    @wifi_main_gateway.setter
-    def wifi_main_gateway(self, input):
-        val = int(input,16).to_bytes(4,'big')
-        self._wifi_main_gateway = str(val[0]) + '.' + str(val[1]) + "." + str(val[2]) + "." + str ( val[3] )
-
-    @property
-    def curent_wifi_ip (self):
-        return self._curent_wifi_ip
-
-    @curent_wifi_ip.setter
-    def curent_wifi_ip(self, input):
-        val = int(input,16).to_bytes(4,'big')
-        self._curent_wifi_ip = str(val[0]) + '.' + str(val[1]) + "." + str(val[2]) + "." + str ( val[3] )
-
-    @property
-    def airflow(self):
-        return self._airflow
-
-    @airflow.setter
-    def airflow(self, input ):
-        val = int (input, 16 )
-        self._airflow = self.airflows[val]
-
-    @property
-    def analogV_treshold (self):
-        return self._analogV_treshold
-
-    @analogV_treshold.setter
-    def analogV_treshold(self, input):
-        val = int(input,16)
-        self._analogV_treshold = str(val) + ' %'
-        
-    @property
-    def unit_type (self):
-        return self._unit_type
-
-    @unit_type.setter
-    def unit_type(self, input):
-        val = int (input, 16 )
-        self._unit_type = self.unit_types[val]        
-
-    @property
-    def night_mode_timer (self):
-        return self._night_mode_timer
-
-    @night_mode_timer.setter
-    def night_mode_timer(self, input):
-        val = int(input,16).to_bytes(2,'big')
-        self._night_mode_timer = str(val[1]).zfill(2) + "h " + str(val[0]).zfill(2) + "m"
-
-    @property
-    def party_mode_timer (self):
-        return self._party_mode_timer
-
-    @party_mode_timer.setter
-    def party_mode_timer(self, input):
-        val = int(input,16).to_bytes(2,'big')
-        self._party_mode_timer = str(val[1]).zfill(2) + "h " + str(val[0]).zfill(2) + "m"
-
-    @property
-    def humidity_status (self):
-        return self._humidity_status
-
-    @humidity_status.setter
-    def humidity_status(self, input):
-        val = int (input, 16 )
-        self._humidity_status = self.statuses[val]
-
-    @property
-    def analogV_status (self):
-        return self._analogV_status
-
-    @analogV_status.setter
-    def analogV_status(self, input):
-        val = int (input, 16 )
-        self._analogV_status = self.statuses[val]
-
+    def get_value(self, param):
+        """ Typed value of param from the last response, None when unknown """
+        idx = self.get_params_index(param)
+        raw = self._store.get(self._row, idx)
+        if raw != None:
+            return schema.decode(idx, raw)
+
+    def get_values(self):
+        """ Typed values of all known params by name """
+        return { schema.by_id[idx].name: schema.decode(idx, raw) for idx, raw in self._store.items(self._row) }
+
+    def stale_params(self):
+        """ Names of the values restored (see snapshot and registry) but not yet confirmed by a response """
+        return [ schema.by_id[idx].name for idx, raw in self._store.items(self._row) if self._store.stamp(self._row, idx) == None ]
+
+    def changed_values(self, changed):
+        """ Typed values of the changed param ids by name """
+        return { schema.by_id[idx].name: schema.decode(idx, self._store.get(self._row, idx)) for idx in changed }
+
+for _p in schema.SCHEMA:
+    setattr(Fan, _p.name, ParamView(_p))
+Fan.state = ParamView(schema.by_name['state'], 'unknown')
+del _p
@@ -0,0 +1,198 @@
+"""Command line tool for fleets of ecofan devices.
+
+Every result is written to stdout as one JSON object per line:
+
+    python -m ecoventv2 poll --hosts fans.txt --interval 5 --params humidity,fan1_speed
+    python -m ecoventv2 get 10.0.0.11 state speed
+    python -m ecoventv2 set 10.0.0.11 speed=low man_speed=40
+    python -m ecoventv2 discover
+
+poll streams a line per fan response with its typed values, the time it
+was received and its latency since the request was sent. Hosts come as
+arguments or from a file with one host per line, v1 and v2 fans are
+detected and polled together.
+"""
+import argparse
+import json
+import sys
+import time
+
+from . import Fan, schema
+from .client import connect, discover
+from .fleet import Fleet
+
+def read_hosts(args):
+    hosts = list(args.host)
+    if args.hosts != None:
+        with open(args.hosts) as fp:
+            for line in fp:
+                line = line.split('#')[0].strip()
+                if line:
+                    hosts.append(line)
+    return hosts
+
+def emit(record):
+    sys.stdout.write(json.dumps(record) + '\n')
+    sys.stdout.flush()
+
+def select_values(values, params):
+    if params == None:
+        return values
+    return { name: values[name] for name in params if name in values }
+
+def emit_error(host, error, name=None):
+    record = { 'host': host }
+    if name != None:
+        record['name'] = name
+    record['time'] = round(time.time(), 3)
+    record['error'] = error
+    emit(record)
+
+def add_hosts(fleet, hosts, args):
+    """ Add the fans at hosts to fleet, v2 fans already knowing their device id.
+        Returns the hosts that did not answer protocol detection """
+    fans = connect(hosts, args.password, timeout=args.timeout)
+    for fan in fans:
+        fleet.add(fan)
+    fleet.poll([ fan for fan in fans if isinstance(fan, Fan) and fan.id == "DEFAULT_DEVICEID" ])
+    found = set(fan.host for fan in fans)
+    return [ host for host in hosts if host not in found ]
+
+def poll_lines(fleet, params, changes, undetected=()):
+    """ Poll fleet once, a line per response and one per fan (or undetected
+        host) that did not answer """
+    for host in undetected:
+        emit_error(host, "timeout")
+    start = time.monotonic()
+    missing = list(fleet.fans)
+    for fan, changed in fleet.iter_poll():
+        missing.remove(fan)
+        values = fan.changed_values(changed) if changes else fan.get_values()
+        emit({ 'host': fan.host, 'name': fan.name, 'time': round(time.time(), 3),
+               'latency_ms': round((time.monotonic() - start) * 1000, 1),
+               'values': select_values(values, params) })
+    for fan in missing:
+        emit_error(fan.host, "timeout", fan.name)
+
+def do_poll(args):
+    params = args.params.split(',') if args.params else None
+    fleet = Fleet((), args.timeout)
+    undetected = read_hosts(args)
+    try:
+        while True:
+            start = time.monotonic()
+            if undetected:
+                undetected = add_hosts(fleet, undetected, args)
+            poll_lines(fleet, params, args.changes, undetected)
+            if args.interval == None:
+                return
+            time.sleep(max(0, args.interval - (time.monotonic() - start)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fleet.close()
+
+def do_get(args):
+    fleet = Fleet((), args.timeout)
+    try:
+        undetected = add_hosts(fleet, args.host, args)
+        poll_lines(fleet, args.params or None, False, undetected)
+    finally:
+        fleet.close()
+
+def parse_value(text):
+    """ Numbers and JSON lists are typed values, anything else an enum name or hex string """
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return text
+    return value if isinstance(value, (int, float, list)) else text
+
+def write_value(param, text):
+    """ Value of param for Fan.set_params() from its command line text, None if it is not valid """
+    if param.kind in ('str', 'ip'):
+        try:
+            return schema.encode(param.id, text).hex()
+        except (ValueError, UnicodeError):
+            return None
+    if param.enum != None and text in param.enum.values():
+        return text
+    value = parse_value(text)
+    if isinstance(value, str):
+        try:
+            bytes.fromhex(value)
+        except ValueError:
+            return None
+    elif isinstance(value, list):
+        value = tuple(value)
+    return value
+
+def do_set(args, parser):
+    values = {}
+    for assignment in args.values:
+        name, sep, text = assignment.partition('=')
+        param = schema.by_name.get(name)
+        if not sep or param == None or not param.writable:
+            parser.error("not a writable param=value: " + assignment)
+        value = write_value(param, text)
+        if value == None:
+            parser.error("not a valid value of " + name + ": " + text)
+        values[name] = value
+    fan = Fan(args.host, args.password, autoupdate=False)
+    fan.update()
+    if fan.id == "DEFAULT_DEVICEID":
+        emit_error(fan.host, "timeout", fan.name)
+        return 1
+    if not args.force:
+        fan.update()
+    try:
+        answered = fan.set_params(values, args.force)
+    except (ValueError, OverflowError, TypeError) as e:
+        emit_error(fan.host, "invalid value: " + str(e), fan.name)
+        return 1
+    if not answered:
+        emit_error(fan.host, "timeout", fan.name)
+        return 1
+    emit({ 'host': fan.host, 'name': fan.name, 'time': round(time.time(), 3),
+           'values': { name: fan.get_value(name) for name in values } })
+
+def do_discover(args):
+    for device in discover(args.broadcast, args.password, timeout=args.timeout):
+        emit(device)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ecoventv2', description="Poll and control ecofan devices, one JSON line per result")
+    parser.add_argument('--password', default="1111", help="fan password")
+    parser.add_argument('--timeout', type=float, default=4, help="seconds to wait for responses")
+    commands = parser.add_subparsers(dest='command')
+    poll = commands.add_parser('poll', help="poll fans and stream their values")
+    poll.add_argument('host', nargs='*', help="fan host names or IP addresses")
+    poll.add_argument('--hosts', help="file with one host per line")
+    poll.add_argument('--interval', type=float, help="poll again every interval seconds")
+    poll.add_argument('--params', help="comma separated params to output (default all)")
+    poll.add_argument('--changes', action='store_true', help="only output values that changed")
+    read = commands.add_parser('get', help="read the values of one fan")
+    read.add_argument('host', nargs=1, help="fan host name or IP address")
+    read.add_argument('params', nargs='*', help="params to output (default all)")
+    write = commands.add_parser('set', help="write params of one fan")
+    write.add_argument('host', help="fan host name or IP address")
+    write.add_argument('values', nargs='+', metavar='param=value', help="enum name, number, text for text params or hex string")
+    write.add_argument('--force', action='store_true', help="write values the fan already reports")
+    search = commands.add_parser('discover', help="find fans by broadcast")
+    search.add_argument('--broadcast', default='<broadcast>', help="broadcast address")
+    args = parser.parse_args(argv)
+    if args.command == 'poll':
+        if not args.host and args.hosts == None:
+            parser.error("no hosts given")
+        do_poll(args)
+    elif args.command == 'get':
+        do_get(args)
+    elif args.command == 'set':
+        return do_set(args, parser)
+    elif args.command == 'discover':
+        do_discover(args)
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    sys.exit(main())
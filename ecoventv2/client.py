@@ -0,0 +1,107 @@
+"""One client for mixed fleets of ecofan v1 and v2 devices.
+
+Old (ecovent) and new (ecoventv2) units listen on the same UDP port but
+speak different frames and each ignores the other's. detect() sends the
+status request of both generations to every host over one socket, a
+host answering with an FD FD frame is v2 and any other answer is v1.
+connect() returns a Fan of the matching class per host, and both kinds
+are polled together by one Fleet. discover() finds the devices of a
+network by broadcasting the same requests.
+
+    fleet = Fleet(connect(['10.0.0.11', '10.0.0.12']))
+    for fan, values in iter_updates(fleet, interval=5):
+        ...
+"""
+import select
+import socket
+import time
+
+import ecovent
+
+from . import Fan, protocol
+from .fleet import _fan_kwargs
+
+V2_HEADER = bytes.fromhex(Fan.HEADER)
+V1_REQUEST = ecovent.Fan.HEADER + bytes.fromhex('0100') + ecovent.Fan.FOOTER
+
+def _address(host, port):
+    if isinstance(host, tuple):
+        return (socket.gethostbyname(host[0]), host[1])
+    return (socket.gethostbyname(host), port)
+
+def detect(hosts, password="1111", port=4000, timeout=2):
+    """ Protocol generation (1 or 2) of every host (a name or a (name, port)
+        tuple) by host, None for hosts that did not answer within timeout """
+    probes = (Fan('', password, port=port, autoupdate=False).poll_frames()[0], V1_REQUEST)
+    addresses = { _address(host, port): host for host in hosts }
+    found = dict.fromkeys(hosts)
+    waiting = len(addresses)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for address in addresses:
+            for probe in probes:
+                sock.sendto(probe, address)
+        deadline = time.monotonic() + timeout
+        while waiting:
+            wait = deadline - time.monotonic()
+            if wait <= 0 or not select.select([sock], [], [], wait)[0]:
+                break
+            data, address = sock.recvfrom(4096)
+            host = addresses.get(address)
+            if host == None or found[host] != None:
+                continue
+            found[host] = 2 if data[:2] == V2_HEADER else 1
+            waiting -= 1
+    finally:
+        sock.close()
+    return found
+
+def connect(hosts, password="1111", port=4000, store=None, registry=None, timeout=2):
+    """ A Fan of the protocol generation each host answers to, hosts are names
+        or dicts of Fan arguments and hosts that do not answer are left out.
+        v2 fans share store and registry, hosts already in the registry are
+        known to be v2 and are not probed """
+    specs = []
+    for host in hosts:
+        kwargs = _fan_kwargs(host)
+        kwargs.setdefault('port', port)
+        kwargs.setdefault('password', password)
+        specs.append(kwargs)
+    unknown = [ (kwargs['host'], kwargs['port']) for kwargs in specs
+                if registry == None or registry.get(kwargs['host'], kwargs['port']) == None ]
+    generations = detect(unknown, password, port, timeout) if unknown else {}
+    fans = []
+    for kwargs in specs:
+        generation = generations.get((kwargs['host'], kwargs['port']), 2)
+        if generation == 1:
+            fans.append(ecovent.Fan(kwargs['host'], kwargs.get('name', "ecofan"), kwargs['port']))
+        elif generation == 2:
+            fans.append(Fan(store=store, registry=registry, autoupdate=False, **kwargs))
+    return fans
+
+def discover(address='<broadcast>', password="1111", port=4000, timeout=2):
+    """ Broadcast the status request of both generations to address, returns
+        { 'host', 'protocol', 'id' } of every device that answered within timeout """
+    probes = (Fan('', password, port=port, autoupdate=False).poll_frames()[0], V1_REQUEST)
+    found = {}
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        for probe in probes:
+            sock.sendto(probe, (address, port))
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = deadline - time.monotonic()
+            if wait <= 0 or not select.select([sock], [], [], wait)[0]:
+                break
+            data, source = sock.recvfrom(4096)
+            host = source[0]
+            if host in found:
+                continue
+            if data[:2] == V2_HEADER:
+                found[host] = { 'host': host, 'protocol': 2, 'id': protocol.parse_frame(data).device_id }
+            else:
+                found[host] = { 'host': host, 'protocol': 1, 'id': None }
+    finally:
+        sock.close()
+    return list(found.values())
@@ -0,0 +1,329 @@
+"""Polling of many ecofan devices at once.
+
+Fleet sends the update request of every fan over one non-blocking UDP
+socket and decodes the responses in the order they arrive. A fan is
+anything with host, port, poll_frames(), apply_frame(), end_poll() and
+changed_values(), so v1 (ecovent.Fan) and v2 fans share one Fleet, see
+client.connect(). apply_frame() returns None for a datagram that is not
+an answer of the fan (another device id), and late answers to an earlier
+round are discarded before the next round is sent. Every ready
+datagram is drained into one preallocated buffer and decoded in place
+before the next is read. ShardedFleet
+splits a large fleet over worker processes, each running its own Fleet
+and decoding straight into a shared FleetStore, so the parent reads
+decoded values from shared memory without any pickling.
+
+iter_updates() and aiter_updates() stream (fan, changed_values) in the
+order the fans answer, so no result waits for the slowest fan.
+"""
+import asyncio
+import multiprocessing
+import select
+import socket
+import time
+
+from . import Fan, metrics, trace
+from .store import FleetStore
+
+class Fleet(object):
+    """Polls a set of fans over one non-blocking socket"""
+
+    # seconds between retries of polls held back by a fan's scheduler
+    retry = 0.05
+
+    def __init__(self, fans=(), timeout=4, policy=None):
+        self.fans = []
+        self.timeout = timeout
+        self.policy = policy
+        self.addresses = {}
+        self.buffer = memoryview(bytearray(4096))
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        for fan in fans:
+            self.add(fan)
+
+    def add(self, fan):
+        address = (socket.gethostbyname(fan.host), fan.port)
+        self.addresses[fan] = address
+        self.fans.append(fan)
+
+    def sendto(self, frame, address):
+        while True:
+            try:
+                return self.socket.sendto(frame, address)
+            except BlockingIOError:
+                select.select([], [self.socket], [], self.timeout)
+
+    def send_poll(self, entry, address):
+        """ Send the frames of a pending poll unless the fan's scheduler holds
+            them back, returns whether they were sent """
+        fan, frames = entry[0], entry[3]
+        scheduler = getattr(fan, 'scheduler', None)
+        if scheduler != None and not scheduler.try_acquire(fan.host, len(frames)):
+            return False
+        tracer = trace.tracer
+        if tracer != None:
+            start = tracer.now()
+        for frame in frames:
+            self.sendto(frame, address)
+        metrics.stats.frames_sent += len(frames)
+        metrics.stats.bytes_sent += sum(len(frame) for frame in frames)
+        if tracer != None:
+            tracer.add('send', start, fan.host)
+        entry[3] = None
+        return True
+
+    def send_held(self, pending):
+        """ Retry the polls held back by a scheduler, returns whether any is still held """
+        held = False
+        for address, entry in pending.items():
+            if entry[3] != None and not self.send_poll(entry, address):
+                held = True
+        return held
+
+    def drain(self):
+        """ Discard the datagrams waiting on the socket, answers that came too late """
+        while True:
+            try:
+                self.socket.recvfrom_into(self.buffer)
+            except BlockingIOError:
+                return
+
+    def start_poll(self, fans=None):
+        """ Send the update requests of fans (default all, or the ones due with
+            a policy), returns the pending polls for receive_ready(), send_held()
+            and finish_poll() """
+        if fans == None:
+            fans = self.fans if self.policy == None else self.policy.due(self.fans)
+        self.drain()
+        tracer = trace.tracer
+        pending = {}
+        for fan in fans:
+            address = self.addresses[fan]
+            if tracer != None:
+                start = tracer.now()
+            frames = fan.poll_frames()
+            if tracer != None:
+                tracer.add('encode', start, fan.host)
+            # fan, responses missing, changed ids, frames not sent yet
+            entry = pending[address] = [ fan, len(frames), [], frames ]
+            self.send_poll(entry, address)
+        return pending
+
+    def end_entry(self, entry, complete):
+        scheduler = getattr(entry[0], 'scheduler', None)
+        if entry[3] == None:
+            metrics.stats.timeouts += entry[1]
+            if scheduler != None:
+                scheduler.release(entry[0].host)
+        entry[0].end_poll(complete)
+        if self.policy != None:
+            self.policy.polled(entry[0], entry[2])
+
+    def receive_ready(self, pending):
+        """ Decode every datagram waiting on the socket, yields (fan, changed ids)
+            for each fan whose poll completed """
+        while True:
+            try:
+                size, address = self.socket.recvfrom_into(self.buffer)
+            except BlockingIOError:
+                return
+            entry = pending.get(address)
+            if entry != None and entry[3] == None:
+                fan = entry[0]
+                changed = fan.apply_frame(self.buffer[:size])
+                if changed == None:
+                    continue
+                metrics.stats.responses += 1
+                metrics.stats.bytes_received += size
+                entry[2].extend(changed)
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del pending[address]
+                    self.end_entry(entry, True)
+                    yield fan, entry[2]
+
+    def finish_poll(self, pending):
+        """ Give up on the polls still pending """
+        for entry in pending.values():
+            self.end_entry(entry, False)
+        pending.clear()
+
+    def iter_poll(self, fans=None):
+        """ Poll fans once, yields (fan, changed ids) as each fan's poll completes """
+        tracer = trace.tracer
+        if tracer != None:
+            poll_start = tracer.now()
+        pending = self.start_poll(fans)
+        deadline = time.monotonic() + self.timeout
+        try:
+            while pending:
+                held = self.send_held(pending)
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    break
+                if tracer != None:
+                    start = tracer.now()
+                ready = select.select([self.socket], [], [], min(wait, self.retry) if held else wait)[0]
+                if tracer != None:
+                    tracer.add('wait', start)
+                if not ready and not held:
+                    break
+                for update in self.receive_ready(pending):
+                    yield update
+        finally:
+            self.finish_poll(pending)
+            if tracer != None:
+                tracer.add('poll', poll_start)
+
+    def next_round(self, start, interval):
+        """ Seconds from now until the round after one started at start, interval
+            seconds after start or when the policy has the next fan due """
+        if self.policy != None:
+            return self.policy.wait(self.fans)
+        return max(0, interval - (time.monotonic() - start))
+
+    def poll(self, fans=None):
+        """ Send the update requests of every fan and decode the responses as
+            they arrive. Returns the fans that answered all requests within timeout """
+        return [ fan for fan, changed in self.iter_poll(fans) ]
+
+    def to_numpy(self, params):
+        """ Typed numpy arrays of params with one row per fan, see FleetStore.to_numpy().
+            All fans must share one FleetStore """
+        stores = set(id(getattr(fan, '_store', None)) for fan in self.fans)
+        store = getattr(self.fans[0], '_store', None) if self.fans else None
+        if len(stores) != 1 or not isinstance(store, FleetStore):
+            raise ValueError("to_numpy() needs all fans in one FleetStore")
+        return store.to_numpy(params, [ fan._row for fan in self.fans ])
+
+    def close(self):
+        self.socket.close()
+
+
+def _fleet(fans, timeout):
+    if isinstance(fans, Fleet):
+        return fans, False
+    return Fleet(fans, timeout), True
+
+def iter_updates(fans, interval=None, timeout=4):
+    """ Poll fans (a list or a Fleet) and yield (fan, changed_values) as each
+        fan's response is decoded. With interval, or a Fleet with a policy,
+        the fleet is polled again every interval seconds (or as the policy
+        says), forever """
+    fleet, own = _fleet(fans, timeout)
+    try:
+        while True:
+            start = time.monotonic()
+            for fan, changed in fleet.iter_poll():
+                yield fan, fan.changed_values(changed)
+            if interval == None and fleet.policy == None:
+                return
+            time.sleep(fleet.next_round(start, interval))
+    finally:
+        if own:
+            fleet.close()
+
+async def aiter_updates(fans, interval=None, timeout=4):
+    """ Asynchronous iter_updates() running on the asyncio event loop """
+    loop = asyncio.get_event_loop()
+    fleet, own = _fleet(fans, timeout)
+    ready = asyncio.Event()
+    loop.add_reader(fleet.socket, ready.set)
+    try:
+        while True:
+            start = loop.time()
+            pending = fleet.start_poll()
+            try:
+                while pending:
+                    for fan, changed in fleet.receive_ready(pending):
+                        yield fan, fan.changed_values(changed)
+                    if not pending:
+                        break
+                    held = fleet.send_held(pending)
+                    wait = start + fleet.timeout - loop.time()
+                    if wait <= 0:
+                        break
+                    ready.clear()
+                    try:
+                        await asyncio.wait_for(ready.wait(), min(wait, fleet.retry) if held else wait)
+                    except asyncio.TimeoutError:
+                        if not held:
+                            break
+            finally:
+                fleet.finish_poll(pending)
+            if interval == None and fleet.policy == None:
+                return
+            await asyncio.sleep(fleet.next_round(start, interval))
+    finally:
+        loop.remove_reader(fleet.socket)
+        if own:
+            fleet.close()
+
+def _fan_kwargs(host):
+    if isinstance(host, dict):
+        return dict(host)
+    return { 'host': host }
+
+def _shard_worker(store, shard, interval, timeout, stop):
+    fans = [ Fan(store=store, row=row, autoupdate=False, **kwargs) for row, kwargs in shard ]
+    fleet = Fleet(fans, timeout)
+    try:
+        while not stop.is_set():
+            start = time.monotonic()
+            fleet.poll()
+            stop.wait(max(0, interval - (time.monotonic() - start)))
+    finally:
+        fleet.close()
+
+
+class ShardedFleet(object):
+    """Polls a large fleet from several worker processes.
+
+    hosts is a list of host names or dicts of Fan keyword arguments. Fans
+    are spread round robin over processes workers (one per core by
+    default), every worker polls its share each interval seconds and
+    writes the decoded values into a shared FleetStore. fans holds a Fan
+    per host in the parent, reading from the same store.
+    """
+
+    def __init__(self, hosts, processes=None, interval=5, timeout=4):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.interval = interval
+        self.timeout = timeout
+        self.store = FleetStore(len(hosts), shared=True)
+        self.fans = []
+        self._shards = [ [] for i in range(self.processes) ]
+        for i, host in enumerate(hosts):
+            kwargs = _fan_kwargs(host)
+            fan = Fan(store=self.store, autoupdate=False, **kwargs)
+            self.fans.append(fan)
+            self._shards[i % self.processes].append((fan._row, kwargs))
+        self._stop = multiprocessing.Event()
+        self._workers = []
+
+    def start(self):
+        self._stop.clear()
+        for shard in self._shards:
+            if shard:
+                worker = multiprocessing.Process(target=_shard_worker,
+                    args=(self.store, shard, self.interval, self.timeout, self._stop), daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def to_numpy(self, params):
+        """ Typed numpy arrays of params with one row per fan, see FleetStore.to_numpy() """
+        return self.store.to_numpy(params, [ fan._row for fan in self.fans ])
+
+    def stop(self):
+        self._stop.set()
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
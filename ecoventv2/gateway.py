@@ -0,0 +1,217 @@
+"""Caching HTTP/JSON gateway for a fleet of ecofan v2 devices.
+
+The gateway polls every fan once per interval and serves the cached
+values to any number of HTTP clients, so client load never reaches the
+fans:
+
+    GET /fans               state of all fans
+    GET /fans/<host|name>   state of one fan
+    GET /metrics            cached values in the Prometheus text format
+
+Responses carry an ETag. A request with a matching If-None-Match gets
+304 Not Modified, and with ?wait=<seconds> it is held open until the
+state changes (long-poll) or the wait expires.
+
+With a snapshot file the gateway serves the values saved by its last run
+(listed as stale until a poll confirms them) right after a restart.
+
+    python -m ecoventv2.gateway --port 8080 --interval 5 10.0.0.11 10.0.0.12
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, unquote, urlparse
+
+from . import Fan
+from .fleet import Fleet, _fan_kwargs
+from .metrics import Exporter
+from .policy import AdaptivePolicy
+from .snapshot import Snapshotter, load
+from .store import FleetStore
+
+class GatewayServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    """Serves the cached fleet state of server.gateway"""
+
+    def do_GET(self):
+        gateway = self.server.gateway
+        url = urlparse(self.path)
+        path = [ unquote(segment) for segment in url.path.rstrip('/').split('/')[1:] ]
+        query = parse_qs(url.query)
+        if path == ['metrics']:
+            return self.send_body(gateway.exporter.render().encode(), 'text/plain; version=0.0.4')
+        if path == ['fans']:
+            fan = None
+        elif len(path) == 2 and path[0] == 'fans':
+            fan = gateway.find(path[1])
+            if fan == None:
+                return self.send_error(404, "unknown fan")
+        else:
+            return self.send_error(404)
+        etag = gateway.etag(fan)
+        if self.headers.get('If-None-Match') == etag:
+            try:
+                wait = float(query.get('wait', ['0'])[0])
+            except ValueError:
+                wait = None
+            if wait == None or not wait >= 0:
+                return self.send_error(400, "wait is not a number of seconds")
+            wait = min(wait, gateway.max_wait)
+            etag = gateway.wait_change(fan, etag, wait)
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+        if fan == None:
+            body = [ gateway.fan_state(f) for f in gateway.fans ]
+        else:
+            body = gateway.fan_state(fan)
+        self.send_body(json.dumps(body).encode(), 'application/json', etag)
+
+    def send_body(self, body, content_type, etag=None):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag != None:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.gateway.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class Gateway(object):
+    """Polls hosts (names or dicts of Fan arguments) and serves their state over HTTP.
+    With a policy (see policy.AdaptivePolicy) each fan is polled when it is due
+    instead of every interval seconds. With a snapshot path the state is
+    restored from it on start and saved to it every snapshot_interval seconds"""
+
+    max_wait = 300
+
+    def __init__(self, hosts, interval=5, timeout=4, address=('', 8080), verbose=False, policy=None,
+                 snapshot=None, snapshot_interval=60):
+        self.interval = interval
+        self.verbose = verbose
+        self.store = FleetStore(len(hosts))
+        self.fans = [ Fan(store=self.store, autoupdate=False, **_fan_kwargs(host)) for host in hosts ]
+        self.fleet = Fleet(self.fans, timeout, policy)
+        self.exporter = Exporter(self.fans)
+        self.snapshotter = None
+        if snapshot != None:
+            load(snapshot, self.fans)
+            self.snapshotter = Snapshotter(self.fans, snapshot, snapshot_interval)
+        self.generation = 0
+        # keeps ETags of an earlier run of the gateway from matching
+        self.nonce = os.urandom(4).hex()
+        self._versions = None
+        self.changed = threading.Condition()
+        self.server = GatewayServer(address, GatewayHandler)
+        self.server.gateway = self
+        self._stop = threading.Event()
+        self._threads = []
+
+    def find(self, key):
+        for fan in self.fans:
+            if key in (fan.host, fan.name):
+                return fan
+
+    def etag(self, fan=None):
+        if fan == None:
+            return '"' + self.nonce + '-' + str(self.generation) + '"'
+        return '"' + self.nonce + '-' + str(fan._row) + '.' + str(self.store.get_version(fan._row)) + '"'
+
+    def fan_state(self, fan):
+        return { 'host': fan.host, 'name': fan.name, 'id': fan.id, 'values': fan.get_values(),
+                 'stale': fan.stale_params() }
+
+    def wait_change(self, fan, etag, wait):
+        """ Wait up to wait seconds for the ETag of fan (None: all fans) to change """
+        deadline = time.monotonic() + wait
+        with self.changed:
+            while self.etag(fan) == etag:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    break
+                self.changed.wait(remaining)
+        return self.etag(fan)
+
+    def poll(self):
+        """ Poll every fan (that is due) once and wake up long-polls if anything changed """
+        self.fleet.poll()
+        versions = [ self.store.get_version(fan._row) for fan in self.fans ]
+        if versions != self._versions:
+            self._versions = versions
+            with self.changed:
+                self.generation += 1
+                self.changed.notify_all()
+
+    def run_poller(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            self.poll()
+            self._stop.wait(self.fleet.next_round(start, self.interval))
+
+    def start(self):
+        """ Start polling and serving in background threads """
+        self._stop.clear()
+        for target in (self.run_poller, self.server.serve_forever):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.snapshotter != None:
+            self.snapshotter.start()
+
+    def stop(self):
+        self._stop.set()
+        with self.changed:
+            self.changed.notify_all()
+        self.server.shutdown()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.server.server_close()
+        self.fleet.close()
+        if self.snapshotter != None:
+            self.snapshotter.stop()
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ecoventv2.gateway', description="Caching HTTP/JSON gateway for ecofan v2 devices")
+    parser.add_argument('hosts', nargs='+', help="fan host names or IP addresses")
+    parser.add_argument('--bind', default='', help="address to listen on")
+    parser.add_argument('--port', type=int, default=8080, help="HTTP port")
+    parser.add_argument('--interval', type=float, default=5, help="seconds between polls of a fan")
+    parser.add_argument('--max-interval', type=float, help="poll stable fans less often, down to once per max-interval seconds")
+    parser.add_argument('--password', default="1111", help="fan password")
+    parser.add_argument('--snapshot', help="file to keep the fleet state in across restarts")
+    parser.add_argument('--verbose', action='store_true', help="log every HTTP request")
+    args = parser.parse_args(argv)
+    hosts = [ { 'host': host, 'password': args.password } for host in args.hosts ]
+    policy = None
+    if args.max_interval != None:
+        policy = AdaptivePolicy(args.interval, args.max_interval)
+    Gateway(hosts, args.interval, address=(args.bind, args.port), verbose=args.verbose, policy=policy,
+            snapshot=args.snapshot).serve_forever()
+
+if __name__ == '__main__':
+    main()
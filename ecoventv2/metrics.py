@@ -0,0 +1,125 @@
+"""Prometheus metrics of a fleet, rendered from cached values.
+
+Exporter renders the values stored by the last polls of a set of v2
+fans, and the transport counters of this process, in the Prometheus text
+exposition format. Rendering never talks to a fan. The samples of a fan
+are only decoded again when the version of its store row changed, so a
+scrape of thousands of steady fans is mostly string joining.
+
+    exporter = Exporter(fans)
+    text = exporter.render()
+
+The gateway serves the same text at /metrics.
+"""
+import time
+
+from . import schema
+
+class TransportStats(object):
+    """Request and response counters of all fans and fleets of this process"""
+
+    __slots__ = ('frames_sent', 'bytes_sent', 'responses', 'bytes_received', 'timeouts', 'decode_errors')
+
+    def __init__(self):
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.responses = 0
+        self.bytes_received = 0
+        self.timeouts = 0
+        self.decode_errors = 0
+
+stats = TransportStats()
+
+DEFAULT_PARAMS = ('state', 'speed', 'boost_status', 'timer_mode', 'timer_counter', 'humidity',
+                  'humidity_treshold', 'battery_voltage', 'analogV', 'relay_status', 'man_speed',
+                  'fan1_speed', 'fan2_speed', 'filter_timer_countdown', 'machine_hours', 'alarm_status',
+                  'filter_replacement_status', 'airflow', 'humidity_status', 'analogV_status')
+
+# metric name suffix and scale to the base unit by schema unit
+UNITS = {
+    '%': ('_percent', 1),
+    'rpm': ('_rpm', 1),
+    'mV': ('_volts', 1 / 1000),
+    's': ('_seconds', 1),
+    'm': ('_seconds', 60),
+}
+
+TRANSPORT = (
+    ('frames_sent', "Request frames sent"),
+    ('bytes_sent', "Bytes of request frames sent"),
+    ('responses', "Response frames received"),
+    ('bytes_received', "Bytes of response frames received"),
+    ('timeouts', "Request frames without response"),
+    ('decode_errors', "Response fields that could not be decoded"),
+)
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def number(value, scale):
+    if scale < 1:
+        return repr(round(value * scale, 6))
+    return str(value * scale)
+
+class Exporter(object):
+    """Renders the cached values of params (names) of fans"""
+
+    def __init__(self, fans, params=DEFAULT_PARAMS, prefix='ecovent_'):
+        self.fans = fans
+        self.prefix = prefix
+        self.metrics = []
+        for name in params:
+            param = schema.by_name[name]
+            suffix, factor = UNITS.get(param.unit, ('', 1))
+            if param.enum != None:
+                description = "Code of " + name + ", " + ", ".join(str(k) + " " + v for k, v in sorted(param.enum.items()))
+            else:
+                description = name.replace('_', ' ').capitalize()
+            self.metrics.append((param.id, factor,
+                "# HELP " + prefix + name + suffix + " " + description + "\n# TYPE " + prefix + name + suffix + " gauge",
+                prefix + name + suffix))
+        # fan -> (store version, sample lines, labels)
+        self._cache = {}
+
+    def labels(self, fan):
+        # the port tells apart fans behind one address
+        return '{host="' + label_value(fan.host) + '",port="' + str(fan.port) + '",name="' + label_value(fan.name) + '"}'
+
+    def samples(self, fan, labels):
+        """ One sample line per metric of fan, None for values it did not report """
+        lines = []
+        for idx, factor, header, name in self.metrics:
+            raw = fan._store.get(fan._row, idx)
+            if raw == None:
+                lines.append(None)
+            else:
+                lines.append(name + labels + " " + number(schema.decode(idx, raw), factor))
+        return lines
+
+    def render(self):
+        """ The metrics in the text exposition format """
+        rows = []
+        seen = []
+        now = time.time() - time.monotonic()
+        for fan in self.fans:
+            version = fan._store.get_version(fan._row)
+            cached = self._cache.get(fan)
+            if cached == None or cached[0] != version:
+                labels = cached[2] if cached != None else self.labels(fan)
+                cached = self._cache[fan] = (version, self.samples(fan, labels), labels)
+            rows.append(cached[1])
+            stamp = fan._store.stamp(fan._row, 0x0001)
+            if stamp != None:
+                seen.append(self.prefix + "last_response_timestamp_seconds" + cached[2] + " " + str(round(now + stamp, 3)))
+        out = []
+        for i, (idx, factor, header, name) in enumerate(self.metrics):
+            out.append(header)
+            out.extend(row[i] for row in rows if row[i] != None)
+        name = self.prefix + "last_response_timestamp_seconds"
+        out.append("# HELP " + name + " Time of the last response of a fan\n# TYPE " + name + " gauge")
+        out.extend(seen)
+        for field, description in TRANSPORT:
+            name = self.prefix + field + "_total"
+            out.append("# HELP " + name + " " + description + "\n# TYPE " + name + " counter")
+            out.append(name + " " + str(getattr(stats, field)))
+        return "\n".join(out) + "\n"
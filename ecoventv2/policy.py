@@ -0,0 +1,89 @@
+"""Adaptive poll intervals.
+
+Most fans sit in a steady state for hours, a few are changing right now.
+AdaptivePolicy gives every fan its own poll interval: it grows by growth
+after each poll in which no tracked value changed, up to max_interval,
+and drops to min_interval as soon as one changed. A write to a fan
+(noticed through the version of its store row) also drops its interval,
+so the effect of the write is seen quickly.
+
+    fleet = Fleet(fans, policy=AdaptivePolicy(min_interval=2, max_interval=120))
+    for fan, values in iter_updates(fleet):
+        ...
+"""
+import time
+
+from . import schema
+
+TRACKED = ('state', 'speed', 'man_speed', 'boost_status', 'timer_mode', 'humidity',
+           'analogV', 'alarm_status', 'airflow')
+
+class AdaptivePolicy(object):
+    """Per fan poll intervals between min_interval and max_interval seconds"""
+
+    def __init__(self, min_interval=5, max_interval=300, growth=2, tracked=TRACKED):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.growth = growth
+        self.tracked = frozenset(tracked)
+        # fan -> [ interval, next poll, store version after the last poll ]
+        self._fans = {}
+
+    def _state(self, fan):
+        state = self._fans.get(fan)
+        if state == None:
+            state = self._fans[fan] = [ self.min_interval, 0.0, None ]
+        return state
+
+    def _version(self, fan):
+        store = getattr(fan, '_store', None)
+        if store != None:
+            return store.get_version(fan._row)
+
+    def interval(self, fan):
+        return self._state(fan)[0]
+
+    def shorten(self, fan, now=None):
+        """ Poll fan again within min_interval, e.g. after a write """
+        if now == None:
+            now = time.monotonic()
+        state = self._state(fan)
+        state[0] = self.min_interval
+        state[1] = min(state[1], now + self.min_interval)
+
+    def due(self, fans, now=None):
+        """ The fans that should be polled now """
+        if now == None:
+            now = time.monotonic()
+        due = []
+        for fan in fans:
+            state = self._state(fan)
+            version = self._version(fan)
+            if version != state[2]:
+                state[2] = version
+                self.shorten(fan, now)
+            if state[1] <= now:
+                due.append(fan)
+        return due
+
+    def wait(self, fans, now=None):
+        """ Seconds until the next of fans is due """
+        if now == None:
+            now = time.monotonic()
+        return max(0, min(self._state(fan)[1] for fan in fans) - now) if fans else self.max_interval
+
+    def polled(self, fan, changed, now=None):
+        """ Schedule the next poll of fan after a poll that changed the param ids
+            (or names) in changed, a poll without answer counts as unchanged """
+        if now == None:
+            now = time.monotonic()
+        state = self._state(fan)
+        for param in changed:
+            name = schema.by_id[param].name if isinstance(param, int) else param
+            if name in self.tracked:
+                state[0] = self.min_interval
+                break
+        else:
+            state[0] = min(self.max_interval, state[0] * self.growth)
+        state[1] = now + state[0]
+        state[2] = self._version(fan)
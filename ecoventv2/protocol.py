@@ -0,0 +1,205 @@
+"""Frame parsing of the ecofan v2 protocol.
+
+A frame is
+
+    FD FD | type | id size | id | password size | password | function | payload | checksum
+
+where the checksum is the 16 bit little endian sum of every byte after
+FD FD. In the payload
+
+    FF nn   sets the high byte of the following parameter ids
+    FE nn   gives the size of the next value (1 byte without it)
+    FD id   marks a parameter the device does not support
+
+parse_frame() walks the payload field by field, parse_header() and
+iter_fields() let a caller use each value as it is parsed instead. A field it cannot use
+(unknown id, wrong size) is reported in the error
+list and skipped by its declared size, so every other value of the
+frame is still returned.
+
+split_request() keeps responses within the size a device can return in
+one datagram by spreading a long read over several request frames.
+
+Frames can be parsed in place from a memoryview of a receive buffer.
+Values are then returned as views into that buffer and are only valid
+until the buffer is reused, stores copy them into their own memory.
+"""
+from collections import deque
+
+from . import schema
+
+class Response(object):
+    """Result of parse_frame()"""
+
+    __slots__ = ('device_id', 'function', 'values', 'unsupported', 'errors')
+
+    def __init__(self):
+        self.device_id = None
+        self.function = None
+        self.values = []
+        self.unsupported = []
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def clear(self):
+        self.device_id = None
+        self.function = None
+        del self.values[:]
+        del self.unsupported[:]
+        del self.errors[:]
+
+
+class BufferPool(object):
+    """Preallocated receive buffers for recv_into, handed out as memoryviews"""
+
+    def __init__(self, count=4, size=4096):
+        self.size = size
+        self._free = deque(memoryview(bytearray(size)) for i in range(count))
+
+    def acquire(self):
+        try:
+            return self._free.pop()
+        except IndexError:
+            return memoryview(bytearray(self.size))
+
+    def release(self, buffer):
+        self._free.append(buffer)
+
+
+class ResponsePool(object):
+    """Reusable Response objects for parse_frame, safe to share between threads"""
+
+    def __init__(self, count=4):
+        self._free = deque(Response() for i in range(count))
+
+    def acquire(self):
+        try:
+            return self._free.pop()
+        except IndexError:
+            return Response()
+
+    def release(self, response):
+        # drop the views into the receive buffer
+        response.clear()
+        self._free.append(response)
+
+
+# longest string value expected in a response
+MAX_STRING = 64
+
+def frame_overhead(device_id, password):
+    """ Bytes of a frame besides its payload """
+    return 2 + 1 + 1 + len(device_id) + 1 + len(password) + 1 + 2
+
+def field_size(idx):
+    """ Largest number of payload bytes the value of idx takes in a response """
+    param = schema.by_id.get(idx)
+    width = param.width or MAX_STRING if param != None else MAX_STRING
+    size = 1 + width
+    if width > 1:
+        size += 2
+    if idx >> 8:
+        size += 2
+    return size
+
+def split_request(ids, space):
+    """ Split ids into as few consecutive chunks as possible whose responses
+        fit in space payload bytes each, returns a list of id lists """
+    chunks = []
+    chunk = []
+    used = 2    # room for a page change back to 00
+    for idx in ids:
+        size = field_size(idx)
+        if chunk and used + size > space:
+            chunks.append(chunk)
+            chunk = []
+            used = 2
+        chunk.append(idx)
+        used += size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def checksum(frame):
+    """ Checksum of a frame without its two trailing checksum bytes """
+    return (sum(frame[2:]) & 0xffff).to_bytes(2, 'little')
+
+def iter_fields(payload, response):
+    """ Yield (id, raw value) of payload, recording unsupported ids and
+        unusable fields in response """
+    page = 0
+    pointer = 0
+    end = len(payload)
+    while pointer < end:
+        p = payload[pointer]
+        if p == 0xff or p == 0xfd:
+            if pointer + 1 >= end:
+                response.errors.append((None, "truncated payload"))
+                return
+            if p == 0xff:
+                page = payload[pointer + 1]
+            else:
+                response.unsupported.append(page << 8 | payload[pointer + 1])
+            pointer += 2
+            continue
+        size = 1
+        if p == 0xfe:
+            if pointer + 2 >= end:
+                response.errors.append((None, "truncated payload"))
+                return
+            size = payload[pointer + 1]
+            pointer += 2
+        idx = page << 8 | payload[pointer]
+        pointer += 1
+        if pointer + size > end:
+            response.errors.append((idx, "truncated value"))
+            return
+        raw = payload[pointer:pointer + size]
+        pointer += size
+        param = schema.by_id.get(idx)
+        if param == None:
+            response.errors.append((idx, "unknown parameter"))
+        elif param.width and param.width != size:
+            response.errors.append((idx, "expected " + str(param.width) + " bytes, got " + str(size)))
+        else:
+            yield idx, raw
+
+def parse_header(data, response):
+    """ Check the header and checksum of a frame and set the device id and
+        function of response, returns the payload for iter_fields() or None
+        when the frame can not be used (the reason is in response.errors) """
+    if len(data) < 8 or data[0] != 0xfd or data[1] != 0xfd:
+        response.errors.append((None, "not an ecofan v2 frame"))
+        return None
+    if sum(data[2:-2]) & 0xffff != data[-2] | data[-1] << 8:
+        response.errors.append((None, "checksum mismatch"))
+        return None
+    pointer = 3
+    id_size = data[pointer]
+    response.device_id = bytes(data[pointer + 1:pointer + 1 + id_size]).decode('latin-1')
+    pointer += 1 + id_size
+    if pointer >= len(data) - 2:
+        response.errors.append((None, "truncated header"))
+        return None
+    pointer += 1 + data[pointer]
+    if pointer >= len(data) - 2:
+        response.errors.append((None, "truncated header"))
+        return None
+    response.function = data[pointer]
+    return data[pointer + 1:len(data) - 2]
+
+def parse_frame(data, response=None):
+    """ Parse a response frame (bytes or memoryview) into a Response, or
+        into response when given. Values are only returned when the frame
+        header and checksum are valid """
+    if response == None:
+        response = Response()
+    else:
+        response.clear()
+    payload = parse_header(data, response)
+    if payload != None:
+        response.values.extend(iter_fields(payload, response))
+    return response
@@ -0,0 +1,97 @@
+"""On-disk registry of known ecofan v2 devices.
+
+The registry maps a host and port to the device id, unit type, firmware and the
+parameter ids the device answered, and a model (unit type and firmware)
+to the parameter ids that model supports, so a restarted service can
+address its fans without device_search or probing round-trips. It is a
+small JSON file read once when the Registry is created and rewritten
+whenever a fan reports different static values. A stored device id the
+fan does not answer to (the unit was swapped) is forgotten by the fan,
+which then looks its id up again with device_search.
+"""
+import json
+import os
+import threading
+
+from . import schema
+
+def _key(host, port):
+    return host + ':' + str(port)
+
+class Registry(object):
+    """Device registry stored in the JSON file path"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            data = {}
+        # entries of files written before the port was part of the key are on port 4000
+        self.entries = { key if ':' in key else _key(key, 4000): entry
+                         for key, entry in data.get('hosts', {}).items() }
+        self.models = { model: frozenset(params) for model, params in data.get('models', {}).items() }
+
+    def get(self, host, port=4000):
+        return self.entries.get(_key(host, port))
+
+    def device_id(self, host, port=4000):
+        entry = self.entries.get(_key(host, port))
+        if entry != None:
+            return entry['id']
+
+    def restore(self, fan):
+        """ Give fan its stored device id, unit type and firmware, returns
+            whether the device id was taken from the registry """
+        entry = self.entries.get(_key(fan.host, fan.port))
+        restored = False
+        if entry != None:
+            if fan._id == "DEFAULT_DEVICEID":
+                fan._id = entry['id']
+                restored = True
+            if entry['unit_type'] != None:
+                fan._store.put(fan._row, 0x00b9, schema.encode(0x00b9, entry['unit_type']))
+            if entry['firmware'] != None:
+                fan._store.put(fan._row, 0x0086, schema.encode(0x0086, entry['firmware']))
+        return restored
+
+    def remember(self, fan):
+        """ Record the static values of fan, the file is only written when they changed """
+        device_id = fan.get_value('device_search')
+        if device_id == None:
+            device_id = fan._id
+        firmware = fan.get_value('firmware')
+        entry = {
+            'id': device_id,
+            'unit_type': fan.get_value('unit_type'),
+            'firmware': list(firmware) if firmware != None else None,
+            'params': sorted(idx for idx, raw in fan._store.items(fan._row)),
+        }
+        key = _key(fan.host, fan.port)
+        with self._lock:
+            if self.entries.get(key) != entry:
+                self.entries[key] = entry
+                self.save()
+
+    def remember_model(self, model, params):
+        """ Record the param ids answered by model """
+        params = frozenset(params)
+        with self._lock:
+            if self.models.get(model) != params:
+                self.models[model] = params
+                self.save()
+
+    def forget(self, host, port=4000):
+        with self._lock:
+            if self.entries.pop(_key(host, port), None) != None:
+                self.save()
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump({ 'hosts': self.entries,
+                        'models': { model: sorted(params) for model, params in self.models.items() } },
+                      fp, sort_keys=True)
+        os.replace(tmp, self.path)
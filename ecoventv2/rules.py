@@ -0,0 +1,177 @@
+"""Local rules acting on fan values as they are polled.
+
+A rule has a condition on one param of a fan and the params to write
+when the condition becomes true, to that fan or to every fan of its
+room:
+
+    rules = [
+        { 'when': 'humidity > 70', 'set': { 'speed': 'high' }, 'scope': 'room' },
+        { 'when': 'humidity < 60', 'set': { 'speed': 'low' }, 'scope': 'room' },
+        { 'when': 'alarm_status != no', 'set': { 'state': 'off' } },
+    ]
+    engine = RuleEngine(rules, fans, rooms={ 'bath': ['10.0.0.11', '10.0.0.12'] })
+    for fan, values in iter_updates(fleet, interval=5):
+        engine.process(fan, values)
+
+Rules are compiled into triggers per param, so a response only
+evaluates the rules of the params it changed. A rule fires once when
+its condition becomes true and again only after it was false, pairs of
+rules with different thresholds give hysteresis. Writes go through a
+WriteBehind queue per target fan, so the writes of several rules to one
+fan share a frame and values the fan already reports are not written.
+Params and values are checked when the rules are compiled, writes that
+fail later (the fan did not answer) are kept in RuleEngine.failures and
+passed to on_error.
+"""
+import operator
+from collections import deque
+
+from . import schema
+from .fleet import iter_updates
+from .writer import WriteBehind
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+def parse_condition(text):
+    """ (param name, comparison, value) of a condition 'param op value', the
+        value is a number or a name of the param's enum """
+    try:
+        name, op, operand = text.split(None, 2)
+        compare = OPERATORS[op]
+    except (ValueError, KeyError):
+        raise ValueError("condition is not 'param op value': " + text)
+    param = schema.by_name.get(name)
+    if param == None:
+        raise ValueError("unknown param in condition: " + text)
+    try:
+        value = float(operand) if '.' in operand else int(operand)
+    except ValueError:
+        value = operand
+        if param.enum != None:
+            for code, label in param.enum.items():
+                if label == operand:
+                    value = code
+            if value == operand:
+                raise ValueError("unknown value of " + name + " in condition: " + text)
+    return name, compare, value
+
+def encode_setting(param, value):
+    """ Raw bytes a write of value (as for Fan.set_param) to param sends,
+        raises ValueError for a value param can not take """
+    if param.enum != None:
+        for code, label in param.enum.items():
+            if label == value:
+                return schema.encode(param.id, code)
+    try:
+        if isinstance(value, str):
+            return bytes.fromhex(value)
+        return schema.encode(param.id, value)
+    except (ValueError, OverflowError, TypeError, IndexError):
+        raise ValueError("not a value of " + param.name + ": " + str(value))
+
+class Rule(object):
+    """A compiled rule"""
+
+    __slots__ = ('number', 'param', 'compare', 'value', 'values', 'scope')
+
+    def __init__(self, number, spec):
+        self.number = number
+        self.param, self.compare, self.value = parse_condition(spec['when'])
+        self.values = dict(spec['set'])
+        for name in self.values:
+            param = schema.by_name.get(name)
+            if param == None or not param.writable:
+                raise ValueError("rule " + str(number) + " sets a param that is not writable: " + str(name))
+            encode_setting(param, self.values[name])
+        self.scope = spec.get('scope', 'fan')
+        if self.scope not in ('fan', 'room'):
+            raise ValueError("scope is 'fan' or 'room': " + str(self.scope))
+
+
+class RuleEngine(object):
+    """Evaluates rules (dicts, see above) against the values of fans.
+    rooms maps a room name to the hosts or names of its fans, on_error is
+    called with (fan, param, value, exception) for every failed write"""
+
+    def __init__(self, rules, fans, rooms=None, delay=0.01, on_error=None):
+        self.delay = delay
+        self.on_error = on_error
+        # latest failed writes as (fan, param, value, exception)
+        self.failures = deque(maxlen=100)
+        self.fans = list(fans)
+        # param name -> rules with a condition on it
+        self.triggers = {}
+        for number, spec in enumerate(rules):
+            rule = Rule(number, spec)
+            self.triggers.setdefault(rule.param, []).append(rule)
+        self.rooms = {}
+        for members in (rooms or {}).values():
+            room = [ fan for fan in self.fans if fan.host in members or fan.name in members ]
+            for fan in room:
+                self.rooms[fan] = room
+        # (rule number, fan) of the rules whose condition is true
+        self.active = set()
+        self.writers = {}
+
+    def writer(self, fan):
+        writer = self.writers.get(fan)
+        if writer == None:
+            writer = self.writers[fan] = WriteBehind(fan, self.delay)
+        return writer
+
+    def process(self, fan, values):
+        """ Evaluate the rules of the params in values (name -> typed value, as
+            yielded by iter_updates()) for fan, returns the writes queued as
+            (target fan, param, value) """
+        queued = []
+        for name in values:
+            rules = self.triggers.get(name)
+            if rules == None:
+                continue
+            value = values[name]
+            for rule in rules:
+                key = (rule.number, fan)
+                try:
+                    true = value != None and rule.compare(value, rule.value)
+                except TypeError:
+                    true = False
+                if not true:
+                    self.active.discard(key)
+                elif key not in self.active:
+                    self.active.add(key)
+                    targets = self.rooms.get(fan, [ fan ]) if rule.scope == 'room' else [ fan ]
+                    for target in targets:
+                        writer = self.writer(target)
+                        for param, setting in rule.values.items():
+                            writer.set(param, setting, self.reporter(target, param, setting))
+                            queued.append((target, param, setting))
+        return queued
+
+    def reporter(self, fan, param, value):
+        """ Done callback of a queued write, records it when it failed """
+        def report(future):
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error != None:
+                self.failures.append((fan, param, value, error))
+                if self.on_error != None:
+                    self.on_error(fan, param, value, error)
+        return report
+
+    def run(self, fleet, interval=5):
+        """ Poll fleet every interval seconds and process every update, forever """
+        for fan, values in iter_updates(fleet, interval):
+            self.process(fan, values)
+
+    def close(self):
+        """ Send the queued writes and stop the write queues """
+        for writer in self.writers.values():
+            writer.close()
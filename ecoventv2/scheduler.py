@@ -0,0 +1,81 @@
+"""Pacing of requests to ecofan devices.
+
+The small controllers of the fans drop datagrams that arrive too fast. A
+Scheduler shared by fans and fleets limits every device to rate request
+frames per second and in_flight outstanding requests, and starts
+interactive requests (writes and reads asked for by a user) ahead of
+background polls waiting for the same device:
+
+    scheduler = Scheduler(rate=5)
+    fan = Fan('10.0.0.11', scheduler=scheduler)
+
+Fan.update() and Fleet polls are background requests, every other Fan
+request is interactive. A Fleet never blocks on the scheduler, it sends
+the poll of a busy fan as soon as the device is free.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+class Scheduler(object):
+    """Limits each device to rate frames per second and in_flight requests"""
+
+    def __init__(self, rate=10, in_flight=1):
+        self.rate = rate
+        self.in_flight = in_flight
+        self._changed = threading.Condition()
+        self._order = itertools.count()
+        # host -> [ earliest next start, requests in flight, heap of waiting (priority, order) ]
+        self._devices = {}
+
+    def _device(self, host):
+        device = self._devices.get(host)
+        if device == None:
+            device = self._devices[host] = [ 0.0, 0, [] ]
+        return device
+
+    def _start(self, device, frames, now):
+        device[0] = max(now, device[0]) + frames / self.rate
+        device[1] += 1
+
+    def acquire(self, host, frames=1, priority=INTERACTIVE):
+        """ Block until a request of frames to host may be sent, call release() when it is answered """
+        with self._changed:
+            device = self._device(host)
+            ticket = (priority, next(self._order))
+            heapq.heappush(device[2], ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if device[1] < self.in_flight and device[2][0] == ticket:
+                        if now >= device[0]:
+                            break
+                        self._changed.wait(device[0] - now)
+                    else:
+                        self._changed.wait()
+            finally:
+                device[2].remove(ticket)
+                heapq.heapify(device[2])
+            self._start(device, frames, now)
+            self._changed.notify_all()
+
+    def try_acquire(self, host, frames=1):
+        """ Start a background request of frames to host if it may be sent now
+            and no other request waits for host, returns whether it started """
+        with self._changed:
+            device = self._device(host)
+            now = time.monotonic()
+            if device[2] or device[1] >= self.in_flight or now < device[0]:
+                return False
+            self._start(device, frames, now)
+            return True
+
+    def release(self, host):
+        """ Finish a request started by acquire() or try_acquire() """
+        with self._changed:
+            self._devices[host][1] -= 1
+            self._changed.notify_all()
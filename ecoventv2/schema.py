@@ -0,0 +1,292 @@
+"""Parameter schema of the ecofan v2 protocol.
+
+Every readable parameter is described by one row of SCHEMA. Decoders,
+encoders and formatters for each row are generated once at import and
+looked up by parameter id, so decoding a response is a table lookup per
+value instead of hand written conversion code.
+
+Typed values are plain python values:
+    uint, enum, percent         int
+    hms                         int seconds
+    hm, dhm, hours              int minutes
+    str, ip                     str
+    date                        (year, month, day, day_of_week)
+    firmware                    (major, minor, year, month, day)
+    schedule                    (day_of_week, period, speed, hour, minute)
+
+Tiers group parameters by how often they change:
+    0  live sensor readings and status
+    1  user settings
+    2  static device and network configuration
+"""
+import math
+from collections import namedtuple
+
+states = {
+    0: 'off',
+    1: 'on' ,
+    2: 'togle'
+}
+
+speeds = {
+     0: 'standby',
+     1: 'low',
+     2: 'medium',
+     3: 'high',
+     0xff: 'manual'
+}
+
+timer_modes = {
+    0: 'off',
+    1: 'night',
+    2: 'party'
+}
+
+statuses = {
+    0: 'off',
+    1: 'on'
+}
+
+airflows = {
+    0: 'ventilation',
+    1: 'heat_recovery',
+    2: 'air_supply'
+}
+
+alarms = {
+    0: 'no',
+    1: 'alarm',
+    2: 'warning'
+}
+
+days_of_week = {
+    0: 'all days',
+    1: 'Monday',
+    2: 'Tuesday',
+    3: 'Wednesday',
+    4: 'Thursday',
+    5: 'Friday',
+    6: 'Saturday',
+    7: 'Sunday',
+    8: 'Mon-Fri',
+    9: 'Sat-Sun',
+}
+
+filters = {
+    0: 'filter replacement not required' ,
+    1: 'replace filter'
+}
+
+unit_types = {
+    0x0300: 'Vento Expert A50-1/A85-1/A100-1 W V.2',
+    0x0400: 'Vento Expert Duo A30-1 W V.2',
+    0x0500: 'Vento Expert A30 W V.2'
+}
+
+wifi_operation_modes = {
+    1: 'client' ,
+    2: 'ap'
+}
+
+wifi_enc_types = {
+    48: 'Open',
+    50: 'wpa-psk' ,
+    51: 'wpa2_psk',
+    52: 'wpa_wpa2_psk'
+}
+
+wifi_dhcps = {
+    0: 'STATIC',
+    1: 'DHCP',
+    2: 'Invert'
+}
+
+Param = namedtuple('Param', 'id name width order kind enum unit writable tier')
+
+# width 0 is a variable length value
+SCHEMA = (
+    #     id      name                         width order     kind        enum                  unit   writable tier
+    Param(0x0001, 'state',                     1, 'little', 'uint',     states,               None,  True,  0),
+    Param(0x0002, 'speed',                     1, 'little', 'uint',     speeds,               None,  True,  0),
+    Param(0x0006, 'boost_status',              1, 'little', 'uint',     statuses,             None,  False, 0),
+    Param(0x0007, 'timer_mode',                1, 'little', 'uint',     timer_modes,          None,  True,  0),
+    Param(0x000b, 'timer_counter',             3, 'little', 'hms',      None,                 's',   False, 0),
+    Param(0x000f, 'humidity_sensor_state',     1, 'little', 'uint',     states,               None,  True,  1),
+    Param(0x0014, 'relay_sensor_state',        1, 'little', 'uint',     states,               None,  True,  1),
+    Param(0x0016, 'analogV_sensor_state',      1, 'little', 'uint',     states,               None,  True,  1),
+    Param(0x0019, 'humidity_treshold',         1, 'little', 'uint',     None,                 '%',   True,  1),
+    Param(0x0024, 'battery_voltage',           2, 'little', 'uint',     None,                 'mV',  False, 0),
+    Param(0x0025, 'humidity',                  1, 'little', 'uint',     None,                 '%',   False, 0),
+    Param(0x002d, 'analogV',                   1, 'little', 'uint',     None,                 None,  False, 0),
+    Param(0x0032, 'relay_status',              1, 'little', 'uint',     statuses,             None,  False, 0),
+    Param(0x0044, 'man_speed',                 1, 'little', 'percent',  None,                 '%',   True,  0),
+    Param(0x004a, 'fan1_speed',                2, 'little', 'uint',     None,                 'rpm', False, 0),
+    Param(0x004b, 'fan2_speed',                2, 'little', 'uint',     None,                 'rpm', False, 0),
+    Param(0x0064, 'filter_timer_countdown',    3, 'little', 'dhm',      None,                 'm',   False, 0),
+    Param(0x0066, 'boost_time',                1, 'little', 'uint',     None,                 'm',   True,  1),
+    Param(0x006f, 'rtc_time',                  3, 'little', 'hms',      None,                 's',   True,  0),
+    Param(0x0070, 'rtc_date',                  4, 'little', 'date',     None,                 None,  True,  1),
+    Param(0x0072, 'weekly_schedule_state',     1, 'little', 'uint',     states,               None,  True,  1),
+    Param(0x0077, 'weekly_schedule_setup',     6, 'little', 'schedule', None,                 None,  True,  1),
+    Param(0x007c, 'device_search',             0, 'little', 'str',      None,                 None,  False, 2),
+    Param(0x007d, 'device_password',           0, 'little', 'str',      None,                 None,  True,  2),
+    Param(0x007e, 'machine_hours',             4, 'little', 'hours',    None,                 'm',   False, 0),
+    Param(0x0083, 'alarm_status',              1, 'little', 'uint',     alarms,               None,  False, 0),
+    Param(0x0085, 'cloud_server_state',        1, 'little', 'uint',     states,               None,  True,  2),
+    Param(0x0086, 'firmware',                  6, 'little', 'firmware', None,                 None,  False, 2),
+    Param(0x0088, 'filter_replacement_status', 1, 'little', 'uint',     statuses,             None,  False, 0),
+    Param(0x0094, 'wifi_operation_mode',       1, 'little', 'uint',     wifi_operation_modes, None,  True,  2),
+    Param(0x0095, 'wifi_name',                 0, 'little', 'str',      None,                 None,  True,  2),
+    Param(0x0096, 'wifi_pasword',              0, 'little', 'str',      None,                 None,  True,  2),
+    Param(0x0099, 'wifi_enc_type',             1, 'little', 'uint',     wifi_enc_types,       None,  True,  2),
+    Param(0x009a, 'wifi_freq_chnnel',          1, 'little', 'uint',     None,                 None,  True,  2),
+    Param(0x009b, 'wifi_dhcp',                 1, 'little', 'uint',     wifi_dhcps,           None,  True,  2),
+    Param(0x009c, 'wifi_assigned_ip',          4, 'little', 'ip',       None,                 None,  True,  2),
+    Param(0x009d, 'wifi_assigned_netmask',     4, 'little', 'ip',       None,                 None,  True,  2),
+    Param(0x009e, 'wifi_main_gateway',         4, 'little', 'ip',       None,                 None,  True,  2),
+    Param(0x00a3, 'curent_wifi_ip',            4, 'little', 'ip',       None,                 None,  False, 2),
+    Param(0x00b7, 'airflow',                   1, 'little', 'uint',     airflows,             None,  True,  1),
+    Param(0x00b8, 'analogV_treshold',          1, 'little', 'uint',     None,                 '%',   True,  1),
+    Param(0x00b9, 'unit_type',                 2, 'big',    'uint',     unit_types,           None,  False, 2),
+    Param(0x0302, 'night_mode_timer',          2, 'little', 'hm',       None,                 'm',   True,  1),
+    Param(0x0303, 'party_mode_timer',          2, 'little', 'hm',       None,                 'm',   True,  1),
+    Param(0x0304, 'humidity_status',           1, 'little', 'uint',     statuses,             None,  False, 0),
+    Param(0x0305, 'analogV_status',            1, 'little', 'uint',     statuses,             None,  False, 0),
+)
+
+
+def _uint_codec(p):
+    width, order = p.width, p.order
+    def decode(raw):
+        return int.from_bytes(raw, order)
+    def encode(val):
+        return int(val).to_bytes(width, order)
+    if p.enum is not None:
+        enum = p.enum
+        def fmt(val):
+            return enum.get(val, str(val))
+    elif p.unit is not None:
+        suffix = " " + p.unit
+        def fmt(val):
+            return str(val) + suffix
+    else:
+        fmt = str
+    return decode, encode, fmt
+
+def _percent_codec(p):
+    def decode(raw):
+        return int(raw[0] / 255 * 100)
+    def encode(val):
+        return bytes([math.ceil(255 / 100 * val)])
+    def fmt(val):
+        return str(val) + " %"
+    return decode, encode, fmt
+
+def _hms_codec(p):
+    def decode(raw):
+        return raw[2] * 3600 + raw[1] * 60 + raw[0]
+    def encode(val):
+        return bytes([val % 60, val // 60 % 60, val // 3600])
+    def fmt(val):
+        return str(val // 3600) + "h " + str(val // 60 % 60) + "m " + str(val % 60) + "s "
+    return decode, encode, fmt
+
+def _hm_codec(p):
+    def decode(raw):
+        return raw[1] * 60 + raw[0]
+    def encode(val):
+        return bytes([val % 60, val // 60])
+    def fmt(val):
+        return str(val // 60).zfill(2) + "h " + str(val % 60).zfill(2) + "m"
+    return decode, encode, fmt
+
+def _dhm_codec(p):
+    # days are one byte for countdowns and two bytes for machine hours
+    days = p.width - 2
+    def decode(raw):
+        return int.from_bytes(raw[2:], 'little') * 1440 + raw[1] * 60 + raw[0]
+    def encode(val):
+        return bytes([val % 60, val // 60 % 24]) + (val // 1440).to_bytes(days, 'little')
+    def fmt(val):
+        return str(val // 1440) + "d " + str(val // 60 % 24) + "h " + str(val % 60) + "m "
+    return decode, encode, fmt
+
+def _date_codec(p):
+    def decode(raw):
+        return (2000 + raw[3], raw[2], raw[0], raw[1])
+    def encode(val):
+        return bytes([val[2], val[3], val[1], val[0] - 2000])
+    def fmt(val):
+        return str(val[3]) + " " + str(val[0]) + "-" + str(val[1]).zfill(2) + "-" + str(val[2]).zfill(2)
+    return decode, encode, fmt
+
+def _firmware_codec(p):
+    def decode(raw):
+        return (raw[0], raw[1], int.from_bytes(raw[4:6], 'little'), raw[3], raw[2])
+    def encode(val):
+        return bytes([val[0], val[1], val[4], val[3]]) + val[2].to_bytes(2, 'little')
+    def fmt(val):
+        return str(val[0]) + '.' + str(val[1]) + " " + str(val[2]) + "-" + str(val[3]).zfill(2) + "-" + str(val[4]).zfill(2)
+    return decode, encode, fmt
+
+def _schedule_codec(p):
+    def decode(raw):
+        return (raw[0], raw[1], raw[2], raw[5], raw[4])
+    def encode(val):
+        return bytes([val[0], val[1], val[2], 0, val[4], val[3]])
+    def fmt(val):
+        return days_of_week.get(val[0], str(val[0])) + '/' + str(val[1]) + ': to ' + str(val[3]) + 'h ' + str(val[4]) + 'm ' + speeds.get(val[2], str(val[2]))
+    return decode, encode, fmt
+
+def _str_codec(p):
+    def decode(raw):
+        return bytes(raw).decode('latin-1')
+    def encode(val):
+        return val.encode('latin-1')
+    return decode, encode, str
+
+def _ip_codec(p):
+    def decode(raw):
+        return str(raw[0]) + '.' + str(raw[1]) + "." + str(raw[2]) + "." + str(raw[3])
+    def encode(val):
+        return bytes(int(i) for i in val.split('.'))
+    return decode, encode, str
+
+codecs = {
+    'uint': _uint_codec,
+    'percent': _percent_codec,
+    'hms': _hms_codec,
+    'hm': _hm_codec,
+    'dhm': _dhm_codec,
+    'hours': _dhm_codec,
+    'date': _date_codec,
+    'firmware': _firmware_codec,
+    'schedule': _schedule_codec,
+    'str': _str_codec,
+    'ip': _ip_codec,
+}
+
+by_id = {}
+by_name = {}
+decoders = {}
+encoders = {}
+formatters = {}
+
+for _p in SCHEMA:
+    by_id[_p.id] = _p
+    by_name[_p.name] = _p
+    decoders[_p.id], encoders[_p.id], formatters[_p.id] = codecs[_p.kind](_p)
+del _p
+
+
+def decode(idx, raw):
+    """ Typed value of parameter idx from its raw response bytes """
+    return decoders[idx](raw)
+
+def encode(idx, val):
+    """ Raw request bytes of parameter idx from a typed value """
+    return encoders[idx](val)
+
+def display(idx, raw):
+    """ Display string of parameter idx from its raw response bytes """
+    return formatters[idx](decoders[idx](raw))
@@ -0,0 +1,144 @@
+"""Snapshots of fleet state for warm restarts.
+
+save() writes the raw value bytes of every fan, with the wall clock time
+each was last confirmed, to a compact binary file. load() puts them back
+into the stores of new fans without a stamp, so they read as plausible
+values right away but count as stale (Fan.stale_params()) and are never
+taken as current for skipping a write until a poll confirms them.
+
+    fans = [ Fan(host, autoupdate=False) for host in hosts ]
+    snapshot.load('fleet.snap', fans)
+    Snapshotter(fans, 'fleet.snap', interval=60).start()
+
+File layout, little endian:
+
+    'EVSNAP' version:u8 fans:u16
+    per fan     host size:u8 host port:u16 device id size:u8 device id values:u16
+    per value   id:u16 size:u8 time:f64 raw
+"""
+import os
+import struct
+import threading
+import time
+
+MAGIC = b'EVSNAP'
+VERSION = 2
+# port of the fans in version 1 snapshots, which did not store it
+V1_PORT = 4000
+
+def _text(data, pointer):
+    size = data[pointer]
+    return data[pointer + 1:pointer + 1 + size].decode('utf-8'), pointer + 1 + size
+
+def _pack_text(text):
+    data = text.encode('utf-8')[:255]
+    return bytes([len(data)]) + data
+
+def dumps(fans):
+    """ Snapshot of the values of fans as bytes """
+    offset = time.time() - time.monotonic()
+    out = [ MAGIC, struct.pack('<BH', VERSION, len(fans)) ]
+    for fan in fans:
+        store, row = fan._store, fan._row
+        values = []
+        for idx, raw in store.items(row):
+            stamp = store.stamp(row, idx)
+            values.append(struct.pack('<HBd', idx, len(raw), offset + stamp if stamp != None else 0.0) + bytes(raw))
+        out.append(_pack_text(fan.host) + struct.pack('<H', fan.port) + _pack_text(fan._id) + struct.pack('<H', len(values)))
+        out.extend(values)
+    return b''.join(out)
+
+def loads(data, fans, max_age=None):
+    """ Restore the values of a snapshot into fans (matched by host and port) as stale
+        values, values older than max_age seconds are left out. Returns the
+        fans found in the snapshot """
+    if data[:len(MAGIC)] != MAGIC or data[len(MAGIC):len(MAGIC) + 1] not in (b'\x01', bytes([VERSION])):
+        raise ValueError("not an ecoventv2 snapshot")
+    try:
+        return _restore(data, fans, max_age, data[len(MAGIC)])
+    except (struct.error, IndexError):
+        raise ValueError("truncated snapshot")
+
+def _restore(data, fans, max_age, version):
+    by_address = { (fan.host, fan.port): fan for fan in fans }
+    oldest = time.time() - max_age if max_age != None else None
+    restored = []
+    count, = struct.unpack_from('<H', data, len(MAGIC) + 1)
+    pointer = len(MAGIC) + 3
+    for i in range(count):
+        host, pointer = _text(data, pointer)
+        port = V1_PORT
+        if version > 1:
+            port, = struct.unpack_from('<H', data, pointer)
+            pointer += 2
+        device_id, pointer = _text(data, pointer)
+        values, = struct.unpack_from('<H', data, pointer)
+        pointer += 2
+        fan = by_address.get((host, port))
+        if fan != None:
+            if fan._id == "DEFAULT_DEVICEID":
+                fan._id = device_id
+            restored.append(fan)
+        changed = False
+        for j in range(values):
+            idx, size, stamp = struct.unpack_from('<HBd', data, pointer)
+            pointer += 11
+            raw = data[pointer:pointer + size]
+            pointer += size
+            if fan != None and (oldest == None or stamp >= oldest):
+                changed = fan._store.put(fan._row, idx, raw) or changed
+        if changed:
+            fan._store.touch(fan._row)
+    return restored
+
+def save(path, fans):
+    """ Write a snapshot of fans to path, replacing it atomically """
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fp:
+        fp.write(dumps(fans))
+    os.replace(tmp, path)
+
+def load(path, fans, max_age=None):
+    """ Restore fans from the snapshot at path, see loads(). A missing file restores nothing """
+    try:
+        with open(path, 'rb') as fp:
+            data = fp.read()
+    except FileNotFoundError:
+        return []
+    return loads(data, fans, max_age)
+
+
+class Snapshotter(object):
+    """Saves a snapshot of fans to path every interval seconds while anything changed"""
+
+    def __init__(self, fans, path, interval=60):
+        self.fans = fans
+        self.path = path
+        self.interval = interval
+        self._versions = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def save(self):
+        """ Save now if any fan changed since the last save """
+        versions = [ fan._store.get_version(fan._row) for fan in self.fans ]
+        if versions != self._versions:
+            save(self.path, self.fans)
+            self._versions = versions
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            self.save()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stop saving, with a last save """
+        self._stop.set()
+        if self._thread != None:
+            self._thread.join()
+            self._thread = None
+        self.save()
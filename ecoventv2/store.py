@@ -0,0 +1,266 @@
+"""Storage of raw parameter values for one fan or a whole fleet.
+
+A Fan keeps the raw response bytes and the confirmation time of every
+parameter in a store, addressed by (row, parameter id). DictStore holds a
+single fan in two dicts. FleetStore holds any number of fans in one row
+each, with a fixed width byte column, a length column and a time column
+per schema parameter, so the cost per fan is a few hundred bytes no
+matter how many fans are stored. A shared FleetStore keeps its columns
+in shared memory so worker processes can decode into it directly.
+
+FleetStore.to_numpy() decodes whole columns at once into numpy arrays
+(numpy is an optional dependency, only needed for that method).
+"""
+from array import array
+from multiprocessing import RawArray
+
+from . import schema
+
+class DictStore(object):
+    """Store for a single fan, the row number is ignored"""
+
+    __slots__ = ('raw', 'stamps', 'version')
+
+    def __init__(self):
+        self.raw = {}
+        self.stamps = {}
+        self.version = 0
+
+    def add_row(self):
+        return 0
+
+    def get(self, row, idx):
+        return self.raw.get(idx)
+
+    def stamp(self, row, idx):
+        return self.stamps.get(idx)
+
+    def put(self, row, idx, raw, stamp=None):
+        changed = self.raw.get(idx) != raw
+        if changed:
+            self.raw[idx] = bytes(raw)
+        if stamp != None:
+            self.stamps[idx] = stamp
+        return changed
+
+    def items(self, row):
+        return self.raw.items()
+
+    def touch(self, row):
+        self.version += 1
+
+    def get_version(self, row):
+        return self.version
+
+
+def shared_array(typecode, size):
+    """ Array of size zeroed items in shared memory, returned with a writable view """
+    buffer = RawArray(typecode, size)
+    return buffer, memoryview(buffer).cast('B').cast(typecode)
+
+
+class Column(object):
+    """Values of one parameter for all rows of a FleetStore"""
+
+    __slots__ = ('width', 'cells', 'lengths', 'stamps')
+
+    def __init__(self, width):
+        self.width = width
+        self.cells = bytearray()
+        self.lengths = bytearray()
+        self.stamps = array('d')
+
+    def grow(self, rows):
+        self.cells.extend(bytes(rows * self.width))
+        self.lengths.extend(bytes(rows))
+        self.stamps.frombytes(bytes(rows * self.stamps.itemsize))
+
+
+def _numpy_uint(cells, param):
+    weights = [ 256 ** i for i in range(param.width) ]
+    if param.order == 'big':
+        weights.reverse()
+    return cells.astype('int64') @ weights
+
+def _numpy_percent(cells, param):
+    return (cells[:, 0] / 255 * 100).astype('int64')
+
+def _numpy_hms(cells, param):
+    cells = cells.astype('int64')
+    return cells[:, 2] * 3600 + cells[:, 1] * 60 + cells[:, 0]
+
+def _numpy_hm(cells, param):
+    cells = cells.astype('int64')
+    return cells[:, 1] * 60 + cells[:, 0]
+
+def _numpy_dhm(cells, param):
+    cells = cells.astype('int64')
+    days = cells[:, 2]
+    if param.width == 4:
+        days = days + cells[:, 3] * 256
+    return days * 1440 + cells[:, 1] * 60 + cells[:, 0]
+
+# vectorized schema decoders, kinds missing here are decoded row by row
+numpy_decoders = {
+    'uint': _numpy_uint,
+    'percent': _numpy_percent,
+    'hms': _numpy_hms,
+    'hm': _numpy_hm,
+    'dhm': _numpy_dhm,
+    'hours': _numpy_dhm,
+}
+
+
+class FleetStore(object):
+    """Columnar store with one row per fan.
+
+    Variable length values (strings) are cut to str_width bytes. A length
+    of 0 marks a value that was never received, a time of 0.0 a value
+    that was never confirmed by the fan. The version of a row is bumped by
+    every response that changed one of its values.
+
+    A shared store is allocated once for capacity rows in shared memory
+    and can be passed to multiprocessing workers as a Process argument.
+    """
+
+    def __init__(self, capacity=64, str_width=32, shared=False):
+        self.str_width = str_width
+        self.shared = shared
+        self.columns = {}
+        for param in schema.SCHEMA:
+            self.columns[param.id] = Column(param.width or str_width)
+        self.versions = array('I')
+        self.row_size = sum(c.width + 1 + c.stamps.itemsize for c in self.columns.values()) + self.versions.itemsize
+        self.rows = 0
+        self.capacity = 0
+        self._buffers = None
+        if shared:
+            self._allocate_shared(capacity)
+        else:
+            self.reserve(capacity)
+
+    def _allocate_shared(self, capacity):
+        self._buffers = {}
+        for idx, column in self.columns.items():
+            cells, column.cells = shared_array('B', capacity * column.width)
+            lengths, column.lengths = shared_array('B', capacity)
+            stamps, column.stamps = shared_array('d', capacity)
+            self._buffers[idx] = (cells, lengths, stamps)
+        versions, self.versions = shared_array('I', capacity)
+        self._buffers['versions'] = versions
+        self.capacity = capacity
+
+    def __getstate__(self):
+        if not self.shared:
+            raise TypeError("only a shared FleetStore can be passed between processes")
+        return { 'str_width': self.str_width, 'rows': self.rows, 'capacity': self.capacity,
+                 'row_size': self.row_size, 'buffers': self._buffers }
+
+    def __setstate__(self, state):
+        self.str_width = state['str_width']
+        self.rows = state['rows']
+        self.capacity = state['capacity']
+        self.row_size = state['row_size']
+        self.shared = True
+        self._buffers = state['buffers']
+        self.columns = {}
+        for param in schema.SCHEMA:
+            column = Column(param.width or self.str_width)
+            cells, lengths, stamps = self._buffers[param.id]
+            column.cells = memoryview(cells).cast('B')
+            column.lengths = memoryview(lengths).cast('B')
+            column.stamps = memoryview(stamps).cast('B').cast('d')
+            self.columns[param.id] = column
+        self.versions = memoryview(self._buffers['versions']).cast('B').cast('I')
+
+    def reserve(self, capacity):
+        """ Preallocate room for capacity rows """
+        if capacity > self.capacity:
+            if self.shared:
+                raise ValueError("a shared FleetStore holds at most " + str(self.capacity) + " rows")
+            for column in self.columns.values():
+                column.grow(capacity - self.capacity)
+            self.versions.frombytes(bytes((capacity - self.capacity) * self.versions.itemsize))
+            self.capacity = capacity
+
+    def add_row(self):
+        if self.rows == self.capacity:
+            self.reserve(max(64, self.capacity * 2))
+        self.rows += 1
+        return self.rows - 1
+
+    def get(self, row, idx):
+        column = self.columns.get(idx)
+        if column != None:
+            length = column.lengths[row]
+            if length:
+                start = row * column.width
+                return bytes(column.cells[start:start + length])
+
+    def stamp(self, row, idx):
+        column = self.columns.get(idx)
+        if column != None and column.stamps[row]:
+            return column.stamps[row]
+
+    def put(self, row, idx, raw, stamp=None):
+        column = self.columns.get(idx)
+        if column != None:
+            length = min(len(raw), column.width)
+            start = row * column.width
+            changed = column.lengths[row] != length or column.cells[start:start + length] != raw[:length]
+            if changed:
+                column.cells[start:start + length] = raw[:length]
+                column.lengths[row] = length
+            if stamp != None:
+                column.stamps[row] = stamp
+            return changed
+        return False
+
+    def items(self, row):
+        for idx in self.columns:
+            raw = self.get(row, idx)
+            if raw != None:
+                yield idx, raw
+
+    def touch(self, row):
+        self.versions[row] = (self.versions[row] + 1) & 0xffffffff
+
+    def get_version(self, row):
+        return self.versions[row]
+
+    def to_numpy(self, params, rows=None):
+        """ Decode params (names) of rows (default all) into numpy arrays.
+            Returns { name: (values, valid) }, valid is a bool mask of the rows
+            holding a value, values of the other rows are 0 or None """
+        import numpy
+        if rows == None:
+            rows = numpy.arange(self.rows)
+        else:
+            rows = numpy.asarray(rows, dtype='int64')
+        arrays = {}
+        for name in params:
+            param = schema.by_name[name]
+            column = self.columns[param.id]
+            valid = numpy.frombuffer(column.lengths, dtype='uint8', count=self.capacity)[rows] != 0
+            cells = numpy.frombuffer(column.cells, dtype='uint8', count=self.capacity * column.width)
+            cells = cells.reshape(self.capacity, column.width)[rows]
+            decoder = numpy_decoders.get(param.kind)
+            if decoder != None:
+                values = decoder(cells, param)
+                values[~valid] = 0
+            else:
+                # filled element by element, numpy.array() would split tuple values into columns
+                values = numpy.empty(len(rows), dtype=object)
+                for i, row in enumerate(rows.tolist()):
+                    values[i] = self._decode(row, param.id)
+            arrays[name] = (values, valid)
+        return arrays
+
+    def _decode(self, row, idx):
+        raw = self.get(row, idx)
+        if raw != None:
+            return schema.decode(idx, raw)
+
+    def nbytes(self):
+        """ Bytes allocated for all columns """
+        return self.capacity * self.row_size
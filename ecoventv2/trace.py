@@ -0,0 +1,88 @@
+"""Opt-in tracing of the request hot path.
+
+While a tracer is enabled every request records spans for its phases:
+
+    encode   building the request frames
+    queue    waiting for the scheduler to admit a request
+    send     writing the frames to the socket
+    wait     waiting for a response datagram
+    decode   parsing a response frame and storing its values
+    apply    bookkeeping after the values are stored
+
+together with an enclosing span for the whole operation (update,
+request, poll). Spans are kept in memory and exported in the Chrome
+trace event format, viewable in chrome://tracing or Perfetto. When no
+tracer is enabled the hot path only pays for a check of trace.tracer.
+
+    with trace.profile('fleet.json'):
+        fleet.poll()
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# the enabled Tracer, None while tracing is off
+tracer = None
+
+class Tracer(object):
+    """Collects the last max_spans spans"""
+
+    def __init__(self, max_spans=100000):
+        self.spans = deque(maxlen=max_spans)
+        self.pid = os.getpid()
+
+    now = staticmethod(time.perf_counter)
+
+    def add(self, name, start, host=None):
+        """ Record a span from start (a now() time) until now, returns the end time """
+        end = time.perf_counter()
+        self.spans.append((name, start, end, threading.get_ident(), host))
+        return end
+
+    def events(self):
+        events = []
+        for name, start, end, tid, host in list(self.spans):
+            event = { 'name': name, 'cat': 'ecoventv2', 'ph': 'X', 'pid': self.pid, 'tid': tid,
+                      'ts': start * 1e6, 'dur': (end - start) * 1e6 }
+            if host != None:
+                event['args'] = { 'host': host }
+            events.append(event)
+        return events
+
+    def chrome_trace(self):
+        """ Spans as a Chrome trace event document """
+        return { 'traceEvents': self.events(), 'displayTimeUnit': 'ms' }
+
+    def save(self, path):
+        with open(path, 'w') as fp:
+            json.dump(self.chrome_trace(), fp)
+
+    def clear(self):
+        self.spans.clear()
+
+
+def enable(max_spans=100000):
+    """ Start tracing, returns the new Tracer """
+    global tracer
+    tracer = Tracer(max_spans)
+    return tracer
+
+def disable():
+    """ Stop tracing, returns the Tracer that was enabled """
+    global tracer
+    stopped, tracer = tracer, None
+    return stopped
+
+@contextmanager
+def profile(path=None, max_spans=100000):
+    """ Trace the body of a with statement and save the spans to path """
+    enabled = enable(max_spans)
+    try:
+        yield enabled
+    finally:
+        disable()
+        if path != None:
+            enabled.save(path)
@@ -0,0 +1,114 @@
+"""Write-behind queue for rapidly changing setpoints.
+
+A UI slider produces many values per second, but only the last one
+matters. WriteBehind collects the writes to a fan for up to delay
+seconds: a newer value replaces a pending value of the same param, and
+all pending params go out together in one write_return frame
+(Fan.set_params). Every set() returns a concurrent.futures.Future that
+completes with the value the fan reports once the write that carried it
+(or replaced it) is answered:
+
+    writer = WriteBehind(fan)
+    for percent in slider_values:
+        writer.set('man_speed', percent)
+    writer.set('speed', 'manual').add_done_callback(print)
+    writer.flush()
+"""
+import threading
+import time
+from concurrent.futures import Future, wait
+
+class WriteBehind(object):
+    """Coalesces the writes to fan and sends them at most delay seconds after the first"""
+
+    def __init__(self, fan, delay=0.05, force=False):
+        self.fan = fan
+        self.delay = delay
+        self.force = force
+        # param -> [ latest value, futures waiting for it ]
+        self._pending = {}
+        self._deadline = None
+        self._closed = False
+        self._changed = threading.Condition()
+        self._thread = None
+
+    def set(self, param, value, callback=None):
+        """ Queue a write of value (as for Fan.set_param) to param, returns a Future.
+            callback is called with the Future when it is done """
+        if self.fan.get_write_value(param, value)[0] == None:
+            raise ValueError("unknown param " + str(param))
+        future = Future()
+        if callback != None:
+            future.add_done_callback(callback)
+        with self._changed:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            entry = self._pending.setdefault(param, [ value, [] ])
+            entry[0] = value
+            entry[1].append(future)
+            if self._deadline == None:
+                self._deadline = time.monotonic() + self.delay
+                self._changed.notify()
+            if self._thread == None:
+                self._thread = threading.Thread(target=self.run, daemon=True)
+                self._thread.start()
+        return future
+
+    def run(self):
+        while True:
+            with self._changed:
+                while not self._closed:
+                    if self._deadline != None:
+                        remaining = self._deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._changed.wait(remaining)
+                    else:
+                        self._changed.wait()
+                if not self._pending and self._closed:
+                    return
+                pending, self._pending = self._pending, {}
+                self._deadline = None
+            self.write(pending)
+
+    def write(self, pending):
+        """ Send the pending writes in one frame and complete their futures """
+        values = {}
+        futures = {}
+        for param, (value, waiting) in pending.items():
+            waiting = [ future for future in waiting if future.set_running_or_notify_cancel() ]
+            if waiting:
+                values[param] = value
+                futures[param] = waiting
+        if not values:
+            return
+        try:
+            answered = self.fan.set_params(values, self.force)
+        except Exception as e:
+            for waiting in futures.values():
+                for future in waiting:
+                    future.set_exception(e)
+            return
+        for param, waiting in futures.items():
+            for future in waiting:
+                if answered:
+                    future.set_result(self.fan.get_value(param))
+                else:
+                    future.set_exception(TimeoutError("no response from " + self.fan.host))
+
+    def flush(self, timeout=None):
+        """ Send the pending writes now and wait until they are answered """
+        with self._changed:
+            futures = [ future for entry in self._pending.values() for future in entry[1] ]
+            if futures:
+                self._deadline = time.monotonic()
+                self._changed.notify()
+        wait(futures, timeout)
+
+    def close(self):
+        """ Send the pending writes and stop the queue """
+        with self._changed:
+            self._closed = True
+            self._changed.notify()
+        if self._thread != None:
+            self._thread.join()
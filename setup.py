@@ -12,6 +12,12 @@ setup(
     description='Python3 library for single-room energy recovery ventilators from Vents / Blauberg / Flexit',
     long_description=long_description,
     python_requires='>=3.6.7',
+    extras_require={
+        'numpy': ['numpy'],
+    },
+    entry_points={
+        'console_scripts': ['ecoventv2 = ecoventv2.__main__:main'],
+    },
     author='Aleksander Lehmann',
     author_email='aleksander@flovik.no',
     url='https://github.com/aglehmann/pyEcovent',